@@ -0,0 +1,166 @@
+"""measures the memory used per loaded replay, before and after the compact Replay layout
+
+usage: PYTHONPATH=. python benchmarks/replay_memory.py [replay count]
+"""
+
+import gc
+import json
+import random
+import sys
+import tracemalloc
+from typing import Callable, List, Optional
+
+from cerebrate.core.replay import Replay, Team
+
+_TAG_POOL: List[str] = [
+    prefix + name
+    for prefix in [Replay.PLAYER_TAG_PREFIX, Replay.OPP_TAG_PREFIX]
+    for name in [
+        "terran",
+        "zerg",
+        "protoss",
+        "random",
+        "win",
+        "loss",
+        "proxy_barracks",
+        "proxy_gateway",
+        "cannon_rush",
+        "bio",
+        "mech",
+        "robo",
+        "stargate",
+        "twilight",
+        "HighTemplar",
+        "Carrier",
+        "Thor",
+        "BroodLord",
+    ]
+] + [Replay.GAME_TAG_PREFIX + name for name in ["1v1", "ladder", "TvZ", "PvT"]]
+
+
+class _LegacyTeam:
+    # The Team layout before it was slotted
+
+    def __init__(self, team_id: str, name: str):
+        self.team_id = team_id
+        self.name = name
+
+
+class _LegacyReplay:
+    # The Replay layout before it was slotted and its tags were interned
+
+    def __init__(
+        self,
+        path: str,
+        replay_hash: str,
+        tags: List[str],
+        notes: str,
+        teams: List[_LegacyTeam],
+        timestamp: Optional[int],
+        player_team: Optional[int],
+        opponent_team: Optional[int],
+        pipeline_version: Optional[str],
+    ):
+        self.path = path
+        self.replay_hash = replay_hash
+        self.tags = list(dict.fromkeys(tags))
+        self.notes = notes
+        self.teams = teams
+        self.timestamp = timestamp
+        self.player_team = player_team
+        self.opponent_team = opponent_team
+        self.pipeline_version = pipeline_version
+
+
+def _make_serialized_docs(replay_count: int) -> str:
+    generator = random.Random(0)
+    teams = [
+        ("1-S2-1-{}".format(index), "Player{}".format(index)) for index in range(50)
+    ]
+    docs = []
+    for index in range(replay_count):
+        replay_hash = "{:064x}".format(generator.getrandbits(256))
+        replay_teams = [teams[0], generator.choice(teams[1:])]
+        docs.append(
+            {
+                "hash": replay_hash,
+                "canonical_path": "/replays/{}.SC2Replay".format(replay_hash),
+                "tags": generator.sample(_TAG_POOL, 12),
+                "notes": "",
+                "teams": [team_id for team_id, _ in replay_teams],
+                "team_names": [name for _, name in replay_teams],
+                "timestamp": 1500000000 + index,
+                "player_team": 0,
+                "opponent_team": 1,
+                "pipeline_version": "0123456789abcdef",
+            }
+        )
+    # Loading through json gives every document its own copies of each string
+    return json.dumps(docs)
+
+
+def _load_legacy_replay(doc: dict) -> _LegacyReplay:
+    return _LegacyReplay(
+        path=doc["canonical_path"],
+        replay_hash=doc["hash"],
+        tags=doc["tags"],
+        notes=doc["notes"],
+        teams=[
+            _LegacyTeam(team_id, name)
+            for team_id, name in zip(doc["teams"], doc["team_names"])
+        ],
+        timestamp=doc["timestamp"],
+        player_team=doc["player_team"],
+        opponent_team=doc["opponent_team"],
+        pipeline_version=doc["pipeline_version"],
+    )
+
+
+def _load_replay(doc: dict) -> Replay:
+    return Replay(
+        path=doc["canonical_path"],
+        replay_hash=doc["hash"],
+        tags=doc["tags"],
+        notes=doc["notes"],
+        teams=[
+            Team(team_id, name)
+            for team_id, name in zip(doc["teams"], doc["team_names"])
+        ],
+        timestamp=doc["timestamp"],
+        player_team=doc["player_team"],
+        opponent_team=doc["opponent_team"],
+        pipeline_version=doc["pipeline_version"],
+    )
+
+
+def _measure_bytes_per_replay(
+    serialized_docs: str, load_replay: Callable[[dict], object]
+) -> float:
+    gc.collect()
+    tracemalloc.start()
+
+    docs = json.loads(serialized_docs)
+    replays = [load_replay(doc) for doc in docs]
+    del docs
+    gc.collect()
+
+    allocated_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return allocated_bytes / len(replays)
+
+
+def main():
+    replay_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    serialized_docs = _make_serialized_docs(replay_count)
+
+    before = _measure_bytes_per_replay(serialized_docs, _load_legacy_replay)
+    after = _measure_bytes_per_replay(serialized_docs, _load_replay)
+
+    print("replays loaded:  {}".format(replay_count))
+    print("before:          {:.0f} bytes/replay".format(before))
+    print("after:           {:.0f} bytes/replay".format(after))
+    print("saving:          {:.1%}".format(1 - after / before))
+
+
+if __name__ == "__main__":
+    main()
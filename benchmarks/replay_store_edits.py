@@ -0,0 +1,114 @@
+"""measures the latency of saving one edited replay, before and after the write-behind storage
+
+usage: PYTHONPATH=. python benchmarks/replay_store_edits.py [replay count] [edit count]
+"""
+
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+import tinydb
+
+from cerebrate.db import ReplayStore
+from cerebrate.db.storage import orjson
+
+
+def _write_db(db_data_path: str, replay_count: int) -> List[str]:
+    generator = random.Random(0)
+    replay_hashes = [
+        "{:064x}".format(generator.getrandbits(256)) for _ in range(replay_count)
+    ]
+    docs = {
+        str(doc_id): {
+            "hash": replay_hash,
+            "canonical_path": "/replays/{}.SC2Replay".format(replay_hash),
+            "tags": ["player:terran", "opponent:zerg", "game:1v1", "game:ladder"],
+            "notes": "",
+            "teams": ["1-S2-1-1", "1-S2-1-{}".format(doc_id % 50 + 2)],
+            "team_names": ["Player", "Opponent{}".format(doc_id % 50)],
+            "timestamp": 1500000000 + doc_id,
+            "player_team": 0,
+            "opponent_team": 1,
+            "pipeline_version": "0123456789abcdef",
+        }
+        for doc_id, replay_hash in enumerate(replay_hashes, 1)
+    }
+    with open(ReplayStore.get_db_path(db_data_path), "w") as db_file:
+        json.dump({tinydb.TinyDB.default_table_name: docs}, db_file)
+    return replay_hashes
+
+
+def _measure_ms_per_edit(
+    edit_replay: Callable[[str, int], None], replay_hashes: List[str]
+) -> float:
+    start_time = time.perf_counter()
+    for index, replay_hash in enumerate(replay_hashes):
+        edit_replay(replay_hash, index)
+    return (time.perf_counter() - start_time) * 1000 / len(replay_hashes)
+
+
+def _measure_json_storage(db_data_path: str, replay_hashes: List[str]) -> float:
+    # How an edit was saved before: a scan for the hash, and a rewrite of the
+    # whole file in place
+    db = tinydb.TinyDB(ReplayStore.get_db_path(db_data_path))
+    table = db.table(tinydb.TinyDB.default_table_name)
+
+    def edit_replay(replay_hash: str, index: int):
+        table.update(
+            {"notes": "edit {}".format(index)}, tinydb.where("hash") == replay_hash
+        )
+
+    try:
+        return _measure_ms_per_edit(edit_replay, replay_hashes)
+    finally:
+        db.close()
+
+
+def _measure_replay_store(
+    db_data_path: str, replay_hashes: List[str], max_unflushed_writes: int
+) -> float:
+    store = ReplayStore(db_data_path, max_unflushed_writes=max_unflushed_writes)
+
+    def edit_replay(replay_hash: str, index: int):
+        replay = store.find_replay_by_hash(replay_hash)
+        replay.notes = "edit {}".format(index)
+        store.update_or_insert_replay(replay)
+
+    try:
+        return _measure_ms_per_edit(edit_replay, replay_hashes)
+    finally:
+        store.close()
+
+
+def main():
+    replay_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    edit_count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    db_data_path = tempfile.mkdtemp()
+    try:
+        replay_hashes = _write_db(db_data_path, replay_count)
+        edited_hashes = random.Random(1).sample(replay_hashes, edit_count)
+
+        before = _measure_json_storage(db_data_path, edited_hashes)
+        write_through = _measure_replay_store(db_data_path, edited_hashes, 1)
+        write_behind = _measure_replay_store(
+            db_data_path, edited_hashes, ReplayStore.DEFAULT_MAX_UNFLUSHED_WRITES
+        )
+        db_size = os.path.getsize(ReplayStore.get_db_path(db_data_path))
+    finally:
+        shutil.rmtree(db_data_path)
+
+    print("replays:         {} ({:.1f} MB)".format(replay_count, db_size / 2**20))
+    print("json codec:      {}".format("orjson" if orjson else "json"))
+    print("before:          {:.2f} ms/edit".format(before))
+    print("write-through:   {:.2f} ms/edit".format(write_through))
+    print("write-behind:    {:.2f} ms/edit".format(write_behind))
+
+
+if __name__ == "__main__":
+    main()
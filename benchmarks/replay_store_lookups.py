@@ -0,0 +1,112 @@
+"""measures replay store read and edit latency as the number of saved replays grows
+
+usage: PYTHONPATH=. python benchmarks/replay_store_lookups.py [largest replay count]
+"""
+
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+import tinydb
+
+from cerebrate.core.replay_query import ReplayQuery
+from cerebrate.db import ReplayStore
+
+_SAMPLE_COUNT = 200
+_PAGE_SIZE = 50
+
+
+def _write_db(db_data_path: str, replay_count: int) -> List[str]:
+    generator = random.Random(0)
+    replay_hashes = [
+        "{:064x}".format(generator.getrandbits(256)) for _ in range(replay_count)
+    ]
+    docs = {
+        str(doc_id): {
+            "hash": replay_hash,
+            "canonical_path": "/replays/{}.SC2Replay".format(replay_hash),
+            "tags": ["player:terran", "opponent:zerg", "game:1v1"]
+            + (["game:rare"] if doc_id % 10000 == 0 else []),
+            "notes": "",
+            "teams": ["1-S2-1-1", "1-S2-1-{}".format(doc_id % 50 + 2)],
+            "team_names": ["Player", "Opponent{}".format(doc_id % 50)],
+            "timestamp": 1500000000 + doc_id,
+            "player_team": 0,
+            "opponent_team": 1,
+            "pipeline_version": "0123456789abcdef",
+        }
+        for doc_id, replay_hash in enumerate(replay_hashes, 1)
+    }
+    with open(ReplayStore.get_db_path(db_data_path), "w") as db_file:
+        json.dump({tinydb.TinyDB.default_table_name: docs}, db_file)
+    return replay_hashes
+
+
+def _measure_ms(operation: Callable[[int], None]) -> float:
+    start_time = time.perf_counter()
+    for index in range(_SAMPLE_COUNT):
+        operation(index)
+    return (time.perf_counter() - start_time) * 1000 / _SAMPLE_COUNT
+
+
+def _measure(replay_count: int):
+    db_data_path = tempfile.mkdtemp()
+    try:
+        replay_hashes = _write_db(db_data_path, replay_count)
+        sampled_hashes = random.Random(1).choices(replay_hashes, k=_SAMPLE_COUNT)
+        # Edits are only written behind, when the store is closed
+        store = ReplayStore(db_data_path, max_unflushed_writes=_SAMPLE_COUNT + 1)
+        try:
+
+            def find_replay(index: int):
+                store.find_replay_by_hash(sampled_hashes[index])
+
+            def edit_replay(index: int):
+                replay = store.find_replay_by_hash(sampled_hashes[index])
+                replay.notes = "edit {}".format(index)
+                store.update_or_insert_replay(replay)
+
+            def find_page(index: int):
+                store.query_replays(
+                    ReplayQuery(limit=_PAGE_SIZE, offset=index * _PAGE_SIZE)
+                )
+
+            def find_rare_tag(_: int):
+                store.query_replays(ReplayQuery(include_tags=["game:rare"]))
+
+            timings = [
+                _measure_ms(find_replay),
+                _measure_ms(edit_replay),
+                _measure_ms(find_page),
+                _measure_ms(find_rare_tag),
+            ]
+        finally:
+            store.close()
+    finally:
+        shutil.rmtree(db_data_path)
+
+    print("{:>9} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f}".format(replay_count, *timings))
+
+
+def main():
+    largest_replay_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    print("ms/operation")
+    print(
+        "{:>9} {:>9} {:>9} {:>9} {:>9}".format(
+            "replays", "find", "edit", "page", "rare tag"
+        )
+    )
+    replay_count = 1000
+    while replay_count < largest_replay_count:
+        _measure(replay_count)
+        replay_count *= 5
+    _measure(largest_replay_count)
+
+
+if __name__ == "__main__":
+    main()
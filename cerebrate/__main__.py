@@ -1,3 +1,83 @@
-from .app import app
+import argparse
 
-app.main()
+
+def _print_progress(processed_count: int, total_count: int):
+    print(f"\r{processed_count}/{total_count} replays", end="", flush=True)
+    if processed_count == total_count:
+        print()
+
+
+def _regenerate(args: argparse.Namespace):
+    from .cerebrate import Cerebrate
+
+    cerebrate = Cerebrate()
+    try:
+        cerebrate.regenerate_saved_replay_info(
+            workers=args.workers, progress_callback=_print_progress, force=args.force
+        )
+    finally:
+        cerebrate.close()
+
+
+def _import(args: argparse.Namespace):
+    from .cerebrate import Cerebrate
+
+    cerebrate = Cerebrate()
+    try:
+        result = cerebrate.import_replays_from_directory(
+            args.directory, workers=args.workers, progress_callback=_print_progress
+        )
+    finally:
+        cerebrate.close()
+
+    print(
+        f"imported {result.imported_count} replays "
+        f"({result.duplicate_count} already saved, {result.failed_count} failed) "
+        f"in {result.elapsed_seconds:.1f}s, "
+        f"{result.replays_per_second:.1f} replays/s"
+    )
+
+
+def _run_app(_: argparse.Namespace):
+    from .app import app
+
+    app.main()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="cerebrate")
+    parser.set_defaults(command=_run_app)
+    subparsers = parser.add_subparsers()
+
+    regenerate_parser = subparsers.add_parser(
+        "regenerate", help="reprocess and retag every saved replay"
+    )
+    regenerate_parser.add_argument(
+        "--workers",
+        type=int,
+        help="number of worker processes (default: one per CPU)",
+    )
+    regenerate_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="also reprocess replays already processed by the current pipeline",
+    )
+    regenerate_parser.set_defaults(command=_regenerate)
+
+    import_parser = subparsers.add_parser(
+        "import", help="save every replay in a directory tree"
+    )
+    import_parser.add_argument("directory", help="directory to search for replays")
+    import_parser.add_argument(
+        "--workers",
+        type=int,
+        help="number of worker processes (default: one per CPU)",
+    )
+    import_parser.set_defaults(command=_import)
+
+    args = parser.parse_args()
+    args.command(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,31 @@
 import asyncio
 import base64
 import glob
-import json
+import io
 import os
 import subprocess
 import sys
 import tempfile
-import urllib.request
-from typing import ClassVar, Optional, List, Tuple
+from typing import ClassVar, Final, Optional, List
 
 import guy
 import keyring
-import requests
+import tornado.web
 
 from cerebrate.app import native_gui_utils
+from cerebrate.app.cerebrate_executor import CerebrateExecutor
 from cerebrate.cerebrate import Cerebrate
 from cerebrate.core import Replay
 from cerebrate.core.replay_query import ReplayQuery
 
+_REPLAY_DATA_PATH: Final = "/replays/"
+_REPLAY_DATA_CHUNK_SIZE: Final = 1024 * 1024
+_DATA_URL_PREFIX: Final = "data:"
+
+
+def _make_replay_data_url(replay_hash: str) -> str:
+    return _REPLAY_DATA_PATH + replay_hash
+
 
 def _make_replay_payload(replay: Replay) -> dict:
     return {
@@ -26,7 +34,7 @@ def _make_replay_payload(replay: Replay) -> dict:
         "teams": [team.name for team in replay.teams],
         "playerTeam": replay.player_team,
         "opponentTeam": replay.opponent_team,
-        "selectedTags": replay.tags,
+        "selectedTags": replay.tags.to_list(),
         "notes": replay.notes,
     }
 
@@ -39,8 +47,43 @@ def _set_replay_info_from_payload(replay: Replay, payload: dict) -> Replay:
     return replay
 
 
-def _replays_from_hashes(cerebrate: Cerebrate, replay_hashes: List[str]):
-    return [cerebrate.find_replay(replay_hash) for replay_hash in replay_hashes]
+def _save_replay_data_url(replay_url: str, replay_hash: str) -> Optional[Replay]:
+    # Replay data that's already archived is never decoded, whether the front end
+    # sent it back as a data url or as a url to the archived replay
+    replay = Index.cerebrate.find_archived_replay(replay_hash)
+    if replay or not replay_url.startswith(_DATA_URL_PREFIX):
+        return replay
+
+    _, _, encoded_replay_data = replay_url.partition(",")
+    return Index.cerebrate.save_replay_data(
+        io.BytesIO(base64.b64decode(encoded_replay_data)), replay_hash
+    )
+
+
+async def _handle_replay_data(web: tornado.web.RequestHandler, replay_hash: str):
+    """serves archived replay data by hash"""
+
+    if web.request.method not in ["GET", "HEAD"]:
+        raise tornado.web.HTTPError(status_code=405)
+
+    replay_path = await Index.executor.read(
+        Index.cerebrate.get_replay_data_path, replay_hash
+    )
+    if not replay_path:
+        raise tornado.web.HTTPError(status_code=404)
+
+    web.set_header("Content-Type", "application/octet-stream")
+    web.set_header(
+        "Content-Disposition", 'attachment; filename="{}.SC2Replay"'.format(replay_hash)
+    )
+    with open(replay_path, "rb") as replay_file:
+        for chunk in iter(lambda: replay_file.read(_REPLAY_DATA_CHUNK_SIZE), b""):
+            web.write(chunk)
+            await web.flush()
+
+
+# guy's decorator registers the handler but doesn't return it
+guy.http(_REPLAY_DATA_PATH + "([0-9a-f]{64})")(_handle_replay_data)
 
 
 def _cross_platform_open(path: str):
@@ -57,28 +100,35 @@ class Index(guy.Guy):
     size = (1200, 800)
 
     cerebrate: ClassVar[Cerebrate] = Cerebrate()
+    executor: ClassVar[CerebrateExecutor] = CerebrateExecutor()
+
+    async def _load_and_update_replay_info(self, replay: Replay) -> Replay:
+        # Repeated selections of the same replay share one parse
+        replay = await Index.executor.coalesce(
+            replay.replay_hash, Index.cerebrate.load_replay_info, replay
+        )
+        await Index.executor.write(Index.cerebrate.update_replay_info, replay)
+        return replay
 
     async def selectMostRecentReplay(self):
-        replay_path = Cerebrate.find_most_recent_replay_path()
+        replay_path = await Index.executor.read(
+            Index.cerebrate.find_most_recent_replay_path
+        )
         if not replay_path:
             return
 
-        with open(replay_path, "rb") as replay_data:
-            replay = Index.cerebrate.save_replay_data(replay_data)
-            if not replay:
-                return
-
-            replay_data.seek(0)
-            prefix = "data:application/octet-stream;base64,"
-            data_url = prefix + base64.b64encode(replay_data.read()).decode("ascii")
+        replay = await Index.executor.write(
+            Index.cerebrate.save_replay_file, replay_path
+        )
+        if not replay:
+            return
 
-        replay = Index.cerebrate.load_replay_info(replay)
-        Index.cerebrate.update_replay_info(replay)
+        replay = await self._load_and_update_replay_info(replay)
         await self.js.replayLoaded(
             {
                 **_make_replay_payload(replay),
                 "replayFileName": os.path.split(replay_path)[1],
-                "replayData": data_url,
+                "replayData": _make_replay_data_url(replay.replay_hash),
                 "force": True,
             }
         )
@@ -87,16 +137,19 @@ class Index(guy.Guy):
         replay_hash: str = payload["replayId"]
         replay_url: Optional[str] = payload.get("replayData")
         if replay_url:
-            with urllib.request.urlopen(replay_url) as replay_data:
-                replay = Index.cerebrate.save_replay_data(replay_data, replay_hash)
+            replay = await Index.executor.write(
+                _save_replay_data_url, replay_url, replay_hash
+            )
         else:
-            replay = Index.cerebrate.find_replay(replay_hash)
+            # Loading the replay info below processes the replay anyway
+            replay = await Index.executor.read(
+                Index.cerebrate.replay_store.find_replay_by_hash, replay_hash
+            )
 
         if not replay:
             return
 
-        replay = Index.cerebrate.load_replay_info(replay)
-        Index.cerebrate.update_replay_info(replay)
+        replay = await self._load_and_update_replay_info(replay)
         await self.js.replayLoaded(
             {
                 **_make_replay_payload(replay),
@@ -105,14 +158,16 @@ class Index(guy.Guy):
         )
 
     async def selectPlayerOpponent(self, payload: dict):
-        replay = self.cerebrate.find_replay(payload["replayId"])
+        replay = await Index.executor.read(
+            Index.cerebrate.find_replay, payload["replayId"]
+        )
         if not replay:
             return
 
         replay.player_team = payload["playerTeam"]
         replay.opponent_team = payload["opponentTeam"]
-        Index.cerebrate.update_replay_info(replay)
-        replay = Index.cerebrate.load_replay_info(replay)
+        await Index.executor.write(Index.cerebrate.update_replay_info, replay)
+        replay = await Index.executor.read(Index.cerebrate.load_replay_info, replay)
 
         await self.js.replayLoaded(_make_replay_payload(replay))
 
@@ -120,17 +175,19 @@ class Index(guy.Guy):
         replay_hash: str = payload["replayId"]
         replay_url: Optional[str] = payload.get("replayData")
         if replay_url:
-            with urllib.request.urlopen(replay_url) as replay_data:
-                replay = Index.cerebrate.save_replay_data(replay_data, replay_hash)
+            replay = await Index.executor.write(
+                _save_replay_data_url, replay_url, replay_hash
+            )
         else:
-            replay = Index.cerebrate.find_replay(replay_hash)
+            replay = await Index.executor.read(Index.cerebrate.find_replay, replay_hash)
 
         if not replay:
             await self.js.replayUpdated({"success": False})
             return
 
-        Index.cerebrate.update_replay_info(
-            _set_replay_info_from_payload(replay, payload)
+        await Index.executor.write(
+            Index.cerebrate.update_replay_info,
+            _set_replay_info_from_payload(replay, payload),
         )
 
         await self.js.replayUpdated({"success": True, "replayId": replay.replay_hash})
@@ -141,14 +198,27 @@ class Index(guy.Guy):
             exclude_tags=payload.get("excludeTags"),
             start_timestamp=payload.get("startTimestamp"),
             end_timestamp=payload.get("endTimestamp"),
+            limit=payload.get("limit"),
+            offset=payload.get("offset", 0),
+            sort_key=payload.get("sortKey", ReplayQuery.NEWEST_FIRST),
         )
-        replays = self.cerebrate.find_replays(query)
-        frequency_table = self.cerebrate.calculate_tag_frequency_table(
-            replays, query.include_tags
+        replays, frequency_table = await asyncio.gather(
+            Index.executor.read(self.cerebrate.find_replays, query),
+            Index.executor.read(
+                self.cerebrate.calculate_query_tag_frequency_table,
+                query,
+                query.include_tags,
+            ),
         )
 
         return {
             "replays": [_make_replay_payload(replay) for replay in replays],
+            "totalCount": (
+                await Index.executor.read(self.cerebrate.count_replays, query)
+                if query.limit is not None
+                else len(replays) + query.offset
+            ),
+            "offset": query.offset,
             "tagFrequencyTable": [
                 {
                     "tag": tag,
@@ -160,15 +230,18 @@ class Index(guy.Guy):
 
     async def forgetReplays(self, payload: dict):
         replay_hashes: List[str] = payload.get("replayIds", [])
-        for replay_hash in replay_hashes:
-            self.cerebrate.forget_replay(replay_hash)
+        await Index.executor.write(self.cerebrate.forget_replays, replay_hashes)
 
     async def exportReplaysToTempDir(self, payload: dict):
         # no automatic cleanup - let os handle cleanup
         export_path = tempfile.mkdtemp()
         replay_hashes: List[str] = payload.get("replayIds", [])
-        replays = _replays_from_hashes(self.cerebrate, replay_hashes)
-        Cerebrate.export_replays_to_directory(replays, export_path)
+        replays = await Index.executor.read(
+            self.cerebrate.find_saved_replays, replay_hashes
+        )
+        await Index.executor.read(
+            Cerebrate.export_replays_to_directory, replays, export_path
+        )
         return export_path
 
     async def exportReplaysToTargetDir(self, payload: dict):
@@ -179,8 +252,12 @@ class Index(guy.Guy):
             return None
 
         replay_hashes: List[str] = payload.get("replayIds", [])
-        replays = _replays_from_hashes(self.cerebrate, replay_hashes)
-        Cerebrate.export_replays_to_directory(replays, export_path)
+        replays = await Index.executor.read(
+            self.cerebrate.find_saved_replays, replay_hashes
+        )
+        await Index.executor.read(
+            Cerebrate.export_replays_to_directory, replays, export_path
+        )
         return export_path
 
     async def exportReplaysToScelight(self, payload: dict):
@@ -198,51 +275,16 @@ class Index(guy.Guy):
 
         keyring.set_password("sc2replaystats", "auth_key", auth_key)
 
-        headers = {"Authorization": auth_key}
-
-        def export_replay(replay: Replay) -> Optional[str]:
-            with open(replay.path, "rb") as file:
-                response = requests.post(
-                    "http://api.sc2replaystats.com/replay",
-                    data={
-                        "upload_method": "ext",
-                    },
-                    headers=headers,
-                    files={"replay_file": file},
-                )
-                if response.status_code != 200:
-                    return None
-
-                return json.loads(response.text).get("replay_queue_id")
-
-        def get_export_id(replay_queue_id: str) -> Optional[str]:
-            response = requests.get(
-                f"http://api.sc2replaystats.com/replay/status/{replay_queue_id}",
-                headers=headers,
-            )
-            if response.status_code != 200:
-                # Don't bother waiting if we can't get an OK response
-                return ""
-            return json.loads(response.text).get("replay_id")
-
         replay_hashes: List[str] = payload.get("replayIds", [])
-        replays = _replays_from_hashes(self.cerebrate, replay_hashes)
-        replay_queue_ids: List[Tuple[Replay, str]] = list(
-            filter(
-                lambda result: result[1] is not None,
-                [(replay, export_replay(replay)) for replay in replays],
-            )
+        replays = await Index.executor.read(
+            self.cerebrate.find_saved_replays, replay_hashes
         )
 
-        loop = True
-        export_ids = []
-        while loop:
-            await asyncio.sleep(3)
-            export_ids = [
-                (replay, get_export_id(replay_queue_id))
-                for replay, replay_queue_id in replay_queue_ids
-            ]
-            loop = any(replay_id is None for replay, replay_id in export_ids)
+        exporter = self.cerebrate.create_sc2replaystats_exporter(auth_key)
+        try:
+            export_ids = await exporter.export_replays(replays)
+        finally:
+            exporter.close()
 
         return [
             {
@@ -250,7 +292,6 @@ class Index(guy.Guy):
                 "exportUrl": f"https://sc2replaystats.com/replay/{export_id}",
             }
             for replay, export_id in export_ids
-            if export_id
         ]
 
     async def openDirInFileManager(self, payload: dict):
@@ -280,7 +321,14 @@ class Index(guy.Guy):
 
 def main():
     app = Index()
-    app.run(one=True)
+    Index.cerebrate.start_replay_watcher()
+    try:
+        app.run(one=True)
+    finally:
+        # Waits for in-flight work, so every edit is flushed to disk on exit
+        Index.executor.close()
+        Index.cerebrate.flush()
+        Index.cerebrate.close()
 
 
 if __name__ == "__main__":
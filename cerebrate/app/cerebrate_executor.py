@@ -0,0 +1,80 @@
+import asyncio
+import concurrent.futures
+import functools
+import os
+from typing import Any, Callable, Dict, Final, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class CerebrateExecutor:
+    # Runs cerebrate's blocking parsing and database calls on worker threads so
+    # the event loop stays responsive. Writes run one at a time on a single
+    # thread, in the order they were made, and reads wait for the writes made
+    # before them so they never see stale data. Concurrent calls for the same
+    # key, e.g. repeated selections of one replay, share a single call.
+
+    _DEFAULT_MAX_READ_WORKERS: Final = 4
+
+    _last_write: Optional[asyncio.Future]
+
+    def __init__(self, max_read_workers: Optional[int] = None):
+        if not max_read_workers:
+            max_read_workers = min(
+                CerebrateExecutor._DEFAULT_MAX_READ_WORKERS, os.cpu_count() or 1
+            )
+
+        self._read_executor: Final[concurrent.futures.ThreadPoolExecutor] = (
+            concurrent.futures.ThreadPoolExecutor(
+                max_workers=max_read_workers, thread_name_prefix="CerebrateRead"
+            )
+        )
+        self._write_executor: Final[concurrent.futures.ThreadPoolExecutor] = (
+            concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="CerebrateWrite"
+            )
+        )
+        self._last_write = None
+        self._in_flight: Final[Dict[Hashable, asyncio.Future]] = {}
+
+    def close(self):
+        self._read_executor.shutdown()
+        self._write_executor.shutdown()
+
+    async def read(self, func: Callable[..., T], *args: Any) -> T:
+        await self._wait_for_writes()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._read_executor, functools.partial(func, *args)
+        )
+
+    async def write(self, func: Callable[..., T], *args: Any) -> T:
+        write = asyncio.get_running_loop().run_in_executor(
+            self._write_executor, functools.partial(func, *args)
+        )
+        self._last_write = write
+        return await write
+
+    async def coalesce(
+        self, key: Hashable, func: Callable[..., T], *args: Any, write: bool = False
+    ) -> T:
+        """runs the call, or joins the call already in flight for the same key"""
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is None:
+            in_flight = asyncio.ensure_future(
+                self.write(func, *args) if write else self.read(func, *args)
+            )
+            self._in_flight[key] = in_flight
+            in_flight.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        # Shielded so that one caller being cancelled doesn't cancel the others
+        return await asyncio.shield(in_flight)
+
+    async def _wait_for_writes(self):
+        if self._last_write is None:
+            return
+
+        last_write = self._last_write
+        await asyncio.wait([last_write])
+        if self._last_write is last_write:
+            self._last_write = None
@@ -1,40 +1,180 @@
+import collections
+import concurrent.futures
 import os
 import shutil
-from collections import OrderedDict
-from typing import BinaryIO, Final, Optional, List, Dict
+import time
+from collections import Counter, OrderedDict
+from typing import (
+    BinaryIO,
+    Final,
+    Optional,
+    List,
+    Dict,
+    Callable,
+    Iterable,
+    Iterator,
+    Tuple,
+)
 
 from cerebrate.core import Replay
 from cerebrate.core.replay_query import ReplayQuery
-from cerebrate.db import ReplayStore
-from cerebrate.processor import ReplayProcessor
-from cerebrate.replaysearch import ReplaySearcher
+from cerebrate.db import AnyReplayStore, create_replay_store
+from cerebrate.processor import ReplayProcessor, process_replays_in_parallel
+from cerebrate.replaysearch import ReplaySearcher, ReplayWatcher
+from cerebrate.sc2replaystats import Sc2ReplayStatsExporter, UploadCache
 from cerebrate.settings.cerebrate_settings import CerebrateSettings
-from cerebrate.util import flatten
 
 APP_DATA_PATH = os.path.normpath(os.path.expanduser("~/.cerebrate"))
 
+_REPLAY_FILE_EXTENSION: Final = ".sc2replay"
+_MAX_PENDING_HASHES_PER_WORKER: Final = 4
+_SC2REPLAYSTATS_UPLOAD_CACHE_FILE_NAME: Final = "sc2replaystats_uploads.json"
 
-def _calculate_tag_frequency(tag: str, replays: List[Replay]) -> int:
-    return sum([1 if tag in replay.tags else 0 for replay in replays])
+
+def _make_tag_frequency_table(
+    tag_counts: Counter, ignore_tags: List[str]
+) -> Dict[str, int]:
+    for tag in ignore_tags:
+        tag_counts.pop(tag, None)
+    return OrderedDict(tag_counts.most_common())
+
+
+def _find_replay_paths(directory: str) -> Iterator[str]:
+    for directory_path, _, file_names in os.walk(directory):
+        for file_name in sorted(file_names):
+            if file_name.lower().endswith(_REPLAY_FILE_EXTENSION):
+                yield os.path.join(directory_path, file_name)
+
+
+def _hash_replay_files(
+    replay_paths: Iterable[str], workers: int
+) -> Iterator[Tuple[str, Optional[str]]]:
+    """returns (path, hash) pairs in order, with no hash for unreadable files"""
+
+    # Hashing is I/O bound and hashlib releases the GIL, so threads are enough
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pending: collections.deque = collections.deque()
+
+        def take_next() -> Tuple[str, Optional[str]]:
+            replay_path, future = pending.popleft()
+            try:
+                return replay_path, future.result()
+            except OSError:
+                return replay_path, None
+
+        for replay_path in replay_paths:
+            pending.append(
+                (
+                    replay_path,
+                    executor.submit(Replay.hash_replay_from_path, replay_path),
+                )
+            )
+            if len(pending) >= workers * _MAX_PENDING_HASHES_PER_WORKER:
+                yield take_next()
+
+        while pending:
+            yield take_next()
+
+
+class ReplayImportResult:
+    imported_count: Final[int]
+    duplicate_count: Final[int]
+    failed_count: Final[int]
+    elapsed_seconds: Final[float]
+
+    def __init__(
+        self,
+        imported_count: int,
+        duplicate_count: int,
+        failed_count: int,
+        elapsed_seconds: float,
+    ):
+        self.imported_count = imported_count
+        self.duplicate_count = duplicate_count
+        self.failed_count = failed_count
+        self.elapsed_seconds = elapsed_seconds
+
+    @property
+    def replays_per_second(self) -> float:
+        if not self.elapsed_seconds:
+            return 0.0
+        return self.imported_count / self.elapsed_seconds
 
 
 class Cerebrate:
-    @staticmethod
-    def find_most_recent_replay_path() -> Optional[str]:
-        return ReplaySearcher.get_most_recently_played_replay_path()
+    _replay_watcher: Optional[ReplayWatcher]
 
     def __init__(self):
         self.settings: Final[CerebrateSettings] = CerebrateSettings(APP_DATA_PATH)
-        self.replay_store: Final[ReplayStore] = ReplayStore(APP_DATA_PATH)
+        self.replay_store: Final[AnyReplayStore] = create_replay_store(
+            APP_DATA_PATH, self.settings.replay_store_engine
+        )
         self.replay_processor: Final[ReplayProcessor] = ReplayProcessor(
             self.replay_store
         )
+        self.sc2replaystats_upload_cache: Final[UploadCache] = UploadCache(
+            os.path.join(APP_DATA_PATH, _SC2REPLAYSTATS_UPLOAD_CACHE_FILE_NAME)
+        )
+        self._replay_watcher = None
+
+    def flush(self):
+        self.replay_store.flush()
+
+    def close(self):
+        self.stop_replay_watcher()
+        self.replay_store.close()
+
+    def get_accounts_path(self) -> Optional[str]:
+        return self.settings.accounts_path or ReplaySearcher.get_default_accounts_path()
+
+    def start_replay_watcher(self):
+        """saves and processes new replays in the accounts directory in the background"""
+
+        accounts_path = self.get_accounts_path()
+        if self._replay_watcher or not accounts_path:
+            return
+
+        self._replay_watcher = ReplayWatcher(accounts_path, self.import_replay_file)
+        self._replay_watcher.start()
+
+    def stop_replay_watcher(self):
+        if self._replay_watcher:
+            self._replay_watcher.stop()
+            self._replay_watcher = None
+
+    def find_most_recent_replay_path(self) -> Optional[str]:
+        if self._replay_watcher and self._replay_watcher.is_ready:
+            return self._replay_watcher.most_recent_replay_path
+
+        return ReplaySearcher.get_most_recently_played_replay_path(
+            self.get_accounts_path()
+        )
+
+    def import_replay_file(self, replay_path: str) -> Optional[Replay]:
+        replay = self.save_replay_file(replay_path)
+        if not replay:
+            return None
+
+        replay = self.load_replay_info(replay)
+        self.update_replay_info(replay)
+        return replay
 
     def save_replay_data(
         self, replay_data: BinaryIO, replay_hash: Optional[str] = None
     ) -> Optional[Replay]:
         return self.replay_store.insert_replay_data(replay_data, replay_hash)
 
+    def save_replay_file(self, replay_path: str) -> Optional[Replay]:
+        with open(replay_path, "rb") as replay_data:
+            return self.save_replay_data(replay_data)
+
+    def find_archived_replay(self, replay_hash: str) -> Optional[Replay]:
+        return self.replay_store.find_archived_replay(replay_hash)
+
+    def get_replay_data_path(self, replay_hash: str) -> Optional[str]:
+        replay = self.replay_store.find_archived_replay(replay_hash)
+        return replay.path if replay else None
+
     def update_replay_info(self, replay: Replay):
         self.replay_store.update_or_insert_replay(replay)
 
@@ -52,9 +192,21 @@ class Cerebrate:
     def find_replays(self, query: ReplayQuery) -> List[Replay]:
         return self.replay_store.query_replays(query)
 
+    def find_saved_replays(self, replay_hashes: Iterable[str]) -> List[Replay]:
+        """returns saved replays as they were last saved, without reprocessing them"""
+
+        return self.replay_store.find_replays_by_hashes(replay_hashes)
+
+    def count_replays(self, query: ReplayQuery) -> int:
+        return self.replay_store.count_replays(query)
+
     def forget_replay(self, replay_hash: str):
         self.replay_store.remove_replay_by_hash(replay_hash)
 
+    def forget_replays(self, replay_hashes: Iterable[str]):
+        with self.replay_store.batch():
+            self.replay_store.remove_replays_by_hashes(replay_hashes)
+
     @staticmethod
     def export_replays_to_directory(replays: List[Replay], export_path: str):
         canonical_export_path = os.path.realpath(export_path)
@@ -67,25 +219,161 @@ class Cerebrate:
         for replay in replays:
             shutil.copy(replay.path, canonical_export_path)
 
+    def create_sc2replaystats_exporter(self, auth_key: str) -> Sc2ReplayStatsExporter:
+        return Sc2ReplayStatsExporter(
+            auth_key,
+            self.sc2replaystats_upload_cache,
+            self.settings.sc2replaystats_base_url
+            or Sc2ReplayStatsExporter.DEFAULT_BASE_URL,
+        )
+
     @staticmethod
     def calculate_tag_frequency_table(
         replays: List[Replay], ignore_tags: List[str]
     ) -> Dict[str, int]:
-        tag_set = set(flatten(replay.tags for replay in replays))
-        frequency_table: Dict[str, int] = dict(
-            (tag, _calculate_tag_frequency(tag, replays))
-            for tag in tag_set.difference(ignore_tags)
+        tag_counts = Counter()
+        for replay in replays:
+            tag_counts.update(replay.tags)
+        return _make_tag_frequency_table(tag_counts, ignore_tags)
+
+    def calculate_query_tag_frequency_table(
+        self, query: ReplayQuery, ignore_tags: List[str]
+    ) -> Dict[str, int]:
+        return _make_tag_frequency_table(
+            self.replay_store.count_tags(query), ignore_tags
         )
-        return OrderedDict(
-            sorted(
-                ((tag, freq) for tag, freq in frequency_table.items()),
-                key=lambda x: x[1],
-                reverse=True,
+
+    def regenerate_saved_replay_info(
+        self,
+        workers: Optional[int] = 1,
+        batch_size: int = 100,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+        force: bool = False,
+    ):
+        replays = [
+            replay
+            for replay in self.replay_store.all_replays()
+            if force or self._needs_regeneration(replay)
+        ]
+
+        processed_replays: Iterable[Replay]
+        if workers == 1:
+            processed_replays = self.replay_processor.process_many(replays)
+        else:
+            processed_replays = process_replays_in_parallel(
+                replays,
+                self.replay_store.create_snapshot(),
+                workers,
+            )
+
+        # The database is written to disk once, after every replay is saved
+        with self.replay_store.batch():
+            batch: List[Replay] = []
+            for processed_count, replay in enumerate(processed_replays, 1):
+                batch.append(replay)
+                if len(batch) >= batch_size:
+                    self.replay_store.update_or_insert_replays(
+                        batch, overwrite_all=True
+                    )
+                    batch.clear()
+
+                if progress_callback:
+                    progress_callback(processed_count, len(replays))
+
+            self.replay_store.update_or_insert_replays(batch, overwrite_all=True)
+
+    def _needs_regeneration(self, replay: Replay) -> bool:
+        if replay.pipeline_version != self.replay_processor.pipeline_version:
+            return True
+
+        # Player teams assigned since the replay was processed may now pick out
+        # its player and opponent
+        return (
+            replay.player_team is None
+            and replay.opponent_team is None
+            and any(
+                self.replay_store.is_known_player_team_id(team.team_id)
+                for team in replay.teams
             )
         )
 
-    def regenerate_saved_replay_info(self):
-        replays = self.replay_store.all_replays()
-        for replay in replays:
-            replay = self.replay_processor.process_replay(replay)
-            self.replay_store.update_or_insert_replay(replay, overwrite_all=True)
+    def import_replays_from_directory(
+        self,
+        directory: str,
+        workers: Optional[int] = None,
+        batch_size: int = 100,
+        progress_callback: Optional[Callable[[int, int], None]] = None,
+    ) -> ReplayImportResult:
+        """archives, processes and saves every replay under directory not already saved"""
+
+        start_time = time.perf_counter()
+        if not workers:
+            workers = os.cpu_count() or 1
+
+        # Only the paths are collected up front, replays are streamed through
+        # hashing, processing and saving
+        replay_paths = list(_find_replay_paths(directory))
+        handled_count = 0
+        duplicate_count = 0
+        failed_count = 0
+
+        def report_handled():
+            nonlocal handled_count
+            handled_count += 1
+            if progress_callback:
+                progress_callback(handled_count, len(replay_paths))
+
+        def on_error(_: Replay, __: Exception):
+            nonlocal failed_count
+            failed_count += 1
+            report_handled()
+
+        def new_replays() -> Iterator[Replay]:
+            nonlocal duplicate_count, failed_count
+            seen_hashes = set()
+            for replay_path, replay_hash in _hash_replay_files(replay_paths, workers):
+                if replay_hash is None:
+                    failed_count += 1
+                    report_handled()
+                elif replay_hash in seen_hashes or self.replay_store.has_replay(
+                    replay_hash
+                ):
+                    duplicate_count += 1
+                    report_handled()
+                else:
+                    seen_hashes.add(replay_hash)
+                    yield Replay(replay_path, replay_hash)
+
+        processed_replays: Iterable[Replay]
+        if workers == 1:
+            processed_replays = self.replay_processor.process_many(
+                new_replays(), on_error
+            )
+        else:
+            processed_replays = process_replays_in_parallel(
+                new_replays(), self.replay_store.create_snapshot(), workers, on_error
+            )
+
+        imported_count = 0
+        with self.replay_store.batch():
+            batch: List[Replay] = []
+            for replay in processed_replays:
+                batch.append(replay)
+                if len(batch) >= batch_size:
+                    self.replay_store.update_or_insert_replays(
+                        batch, overwrite_all=True
+                    )
+                    imported_count += len(batch)
+                    batch.clear()
+
+                report_handled()
+
+            self.replay_store.update_or_insert_replays(batch, overwrite_all=True)
+            imported_count += len(batch)
+
+        return ReplayImportResult(
+            imported_count,
+            duplicate_count,
+            failed_count,
+            time.perf_counter() - start_time,
+        )
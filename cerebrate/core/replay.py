@@ -1,17 +1,23 @@
 import functools
 import hashlib
 import os
+import sys
 from typing import BinaryIO, Final, List, Optional, final, Iterable
 
+from .tag_list import TagList
+
 
 @final
 class Team:
+    __slots__ = ("team_id", "name")
+
     team_id: Final[str]
     name: Final[str]
 
     def __init__(self, team_id: str, name: str):
-        self.team_id = team_id
-        self.name = name
+        # The same few teams appear across most replays
+        self.team_id = sys.intern(team_id)
+        self.name = sys.intern(name)
 
 
 @final
@@ -20,15 +26,28 @@ class Replay:
     OPP_TAG_PREFIX: Final = "opponent:"
     GAME_TAG_PREFIX: Final = "game:"
 
+    __slots__ = (
+        "path",
+        "replay_hash",
+        "tags",
+        "notes",
+        "teams",
+        "timestamp",
+        "player_team",
+        "opponent_team",
+        "pipeline_version",
+    )
+
     path: Final[str]
     replay_hash: Final[str]
 
-    tags: Final[List[str]]
+    tags: Final[TagList]
     notes: str
     teams: Final[List[Team]]
     timestamp: Optional[int]
     player_team: Optional[int]
     opponent_team: Optional[int]
+    pipeline_version: Optional[str]
 
     @staticmethod
     def hash_replay_data(replay_data: BinaryIO) -> str:
@@ -66,6 +85,7 @@ class Replay:
         timestamp: Optional[int] = None,
         player_team: Optional[int] = None,
         opponent_team: Optional[int] = None,
+        pipeline_version: Optional[str] = None,
     ):
         if not replay_hash:
             replay_hash = Replay.hash_replay_from_path(path)
@@ -81,26 +101,22 @@ class Replay:
 
         self.path = os.path.normpath(path)
         self.replay_hash = replay_hash
-        self.tags = list(dict.fromkeys(tags))
+        self.tags = TagList(tags)
         self.notes = notes
         self.teams = teams
         self.timestamp = timestamp
         self.player_team = player_team
         self.opponent_team = opponent_team
+        self.pipeline_version = pipeline_version
 
     def set_tags(self, tags: Iterable[str]):
-        self.tags.clear()
-        self.tags.extend(dict.fromkeys(tags))
+        self.tags.replace(tags)
 
     def append_tag(self, tag: str):
-        if tag not in set(self.tags):
-            self.tags.append(tag)
+        self.tags.append(tag)
 
     def prepend_tag(self, tag: str):
-        if tag not in set(self.tags):
-            new_tags = [tag] + self.tags
-            self.set_tags(new_tags)
+        self.tags.prepend(tag)
 
     def remove_tag(self, tag: str):
-        if tag in set(self.tags):
-            self.tags.remove(tag)
+        self.tags.discard(tag)
@@ -1,11 +1,20 @@
-from typing import List, Optional
+import itertools
+from typing import Final, Iterable, List, Optional
 
 
 class ReplayQuery:
+    NEWEST_FIRST: Final = "newest_first"
+    OLDEST_FIRST: Final = "oldest_first"
+
     include_tags: List[str]
     exclude_tags: List[str]
     start_timestamp: Optional[int]
     end_timestamp: Optional[int]
+    # Results are returned a page at a time when a limit is set, with offset
+    # acting as the cursor to the start of the page
+    limit: Optional[int]
+    offset: int
+    sort_key: str
 
     def __init__(
         self,
@@ -13,13 +22,38 @@ class ReplayQuery:
         exclude_tags: Optional[List[str]] = None,
         start_timestamp: Optional[int] = None,
         end_timestamp: Optional[int] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        sort_key: str = NEWEST_FIRST,
     ):
         if include_tags is None:
             include_tags = []
         if exclude_tags is None:
             exclude_tags = []
 
+        if limit is not None and limit < 0:
+            raise ValueError("limit must not be negative")
+        if offset < 0:
+            raise ValueError("offset must not be negative")
+        if sort_key not in [ReplayQuery.NEWEST_FIRST, ReplayQuery.OLDEST_FIRST]:
+            raise ValueError("unknown sort key: " + str(sort_key))
+
         self.include_tags = include_tags
         self.exclude_tags = exclude_tags
         self.start_timestamp = start_timestamp
         self.end_timestamp = end_timestamp
+        self.limit = limit
+        self.offset = offset
+        self.sort_key = sort_key
+
+    @property
+    def is_newest_first(self) -> bool:
+        return self.sort_key == ReplayQuery.NEWEST_FIRST
+
+    def get_page(self, items: Iterable) -> list:
+        """returns the slice of the sorted items covered by the query's page"""
+
+        # Lazy items are only consumed up to the end of the page
+        if self.limit is None:
+            return list(itertools.islice(items, self.offset, None))
+        return list(itertools.islice(items, self.offset, self.offset + self.limit))
@@ -0,0 +1,53 @@
+import sys
+from typing import Any, Dict, Iterable, Iterator, List
+
+
+def intern_tag(tag: str) -> str:
+    return sys.intern(tag)
+
+
+class TagList:
+    # Tags in insertion order with O(1) membership, backed by a dict. Tag strings
+    # are interned, so every replay with the same tag shares one string.
+
+    __slots__ = ("_tags",)
+
+    _tags: Dict[str, None]
+
+    def __init__(self, tags: Iterable[str] = ()):
+        self._tags = dict.fromkeys(map(intern_tag, tags))
+
+    def __contains__(self, tag: object) -> bool:
+        return tag in self._tags
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._tags)
+
+    def __len__(self) -> int:
+        return len(self._tags)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, TagList):
+            return list(self._tags) == list(other._tags)
+        if isinstance(other, list):
+            return list(self._tags) == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return "TagList({!r})".format(list(self._tags))
+
+    def to_list(self) -> List[str]:
+        return list(self._tags)
+
+    def replace(self, tags: Iterable[str]):
+        self._tags = dict.fromkeys(map(intern_tag, tags))
+
+    def append(self, tag: str):
+        self._tags.setdefault(intern_tag(tag), None)
+
+    def prepend(self, tag: str):
+        if tag not in self._tags:
+            self._tags = {intern_tag(tag): None, **self._tags}
+
+    def discard(self, tag: str):
+        self._tags.pop(tag, None)
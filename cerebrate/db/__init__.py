@@ -1 +1,5 @@
 from .replay_store import ReplayStore
+from .replay_store_snapshot import ReplayStoreSnapshot
+from .sqlite_replay_store import SqliteReplayStore
+from .storage import DatabaseModifiedError
+from .stores import AnyReplayStore, create_replay_store
@@ -0,0 +1,52 @@
+import os
+from typing import Final
+
+from .replay_store import ReplayStore
+from .sqlite_replay_store import SqliteReplayStore
+
+_MIGRATION_SUFFIX: Final = ".migrating"
+
+
+def should_migrate_to_sqlite(db_data_path: str) -> bool:
+    tinydb_path = ReplayStore.get_db_path(db_data_path)
+    return (
+        os.path.exists(tinydb_path)
+        and os.path.getsize(tinydb_path) > 0
+        and not os.path.exists(SqliteReplayStore.get_db_path(db_data_path))
+    )
+
+
+def _remove_sqlite_db(db_path: str):
+    for path in [db_path, db_path + "-wal", db_path + "-shm"]:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def migrate_to_sqlite(db_data_path: str) -> int:
+    """imports every replay in replays.json into a new sqlite replay store"""
+
+    db_path = SqliteReplayStore.get_db_path(db_data_path)
+    if os.path.exists(db_path):
+        raise ValueError("sqlite replay store already exists")
+
+    # The store is only moved into place once every replay has been copied, so
+    # a failed migration is retried rather than leaving a partial library
+    temp_db_path = db_path + _MIGRATION_SUFFIX
+    _remove_sqlite_db(temp_db_path)
+
+    source = ReplayStore(db_data_path)
+    try:
+        target = SqliteReplayStore(db_data_path, temp_db_path)
+        try:
+            replays = source.all_replays()
+            target.update_or_insert_replays(replays, overwrite_all=True)
+        finally:
+            target.close()
+
+        os.replace(temp_db_path, db_path)
+        return len(replays)
+    except BaseException:
+        _remove_sqlite_db(temp_db_path)
+        raise
+    finally:
+        source.close()
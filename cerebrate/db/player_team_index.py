@@ -0,0 +1,44 @@
+from collections import Counter
+from typing import Dict, Final, Iterable, Iterator, Optional, Tuple
+
+
+class PlayerTeamIndex:
+    # Team ids that have been the player's team in at least one replay, reference
+    # counted by replay so that updating or removing a replay keeps the set exact.
+
+    def __init__(self):
+        self._replay_player_team_ids: Final[Dict[str, str]] = {}
+        self._player_team_id_counts: Final[Counter] = Counter()
+
+    def __contains__(self, team_id: str) -> bool:
+        return team_id in self._player_team_id_counts
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._player_team_id_counts)
+
+    def __len__(self) -> int:
+        return len(self._player_team_id_counts)
+
+    def rebuild(self, replay_player_team_ids: Iterable[Tuple[str, Optional[str]]]):
+        self._replay_player_team_ids.clear()
+        self._player_team_id_counts.clear()
+        for replay_hash, team_id in replay_player_team_ids:
+            self.set_player_team_id(replay_hash, team_id)
+
+    def set_player_team_id(self, replay_hash: str, team_id: Optional[str]):
+        if self._replay_player_team_ids.get(replay_hash) == team_id:
+            return
+
+        self.remove(replay_hash)
+        if team_id is not None:
+            self._replay_player_team_ids[replay_hash] = team_id
+            self._player_team_id_counts[team_id] += 1
+
+    def remove(self, replay_hash: str):
+        team_id = self._replay_player_team_ids.pop(replay_hash, None)
+        if team_id is None:
+            return
+
+        self._player_team_id_counts[team_id] -= 1
+        if not self._player_team_id_counts[team_id]:
+            del self._player_team_id_counts[team_id]
@@ -0,0 +1,88 @@
+import functools
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import BinaryIO, Final, Optional
+
+from cerebrate.core.replay import Replay
+
+
+class ReplayArchive:
+    _REPLAY_FILE_EXTENSION: Final = ".SC2Replay"
+    _REPLAY_SUMMARY_FILE_EXTENSION: Final = ".summary.json"
+    _COPY_BUFFER_SIZE: Final = 1024 * 1024
+
+    def __init__(self, archive_path: str):
+        if not os.path.exists(archive_path):
+            os.makedirs(archive_path)
+
+        self.archive_path: Final[str] = archive_path
+
+    def get_replay_path(self, replay_hash: str) -> str:
+        return os.path.join(
+            self.archive_path, replay_hash + ReplayArchive._REPLAY_FILE_EXTENSION
+        )
+
+    def find_replay_path(self, replay_hash: str) -> Optional[str]:
+        replay_path = self.get_replay_path(replay_hash)
+        return replay_path if os.path.exists(replay_path) else None
+
+    def get_replay_summary_path(self, replay_hash: str) -> str:
+        return os.path.join(
+            self.archive_path,
+            replay_hash + ReplayArchive._REPLAY_SUMMARY_FILE_EXTENSION,
+        )
+
+    def load_replay_summary(self, replay_hash: str) -> Optional[dict]:
+        try:
+            with open(self.get_replay_summary_path(replay_hash), "r") as summary_file:
+                return json.load(summary_file)
+        except (OSError, ValueError):
+            return None
+
+    def save_replay_summary(self, replay_hash: str, replay_summary: dict):
+        summary_path = self.get_replay_summary_path(replay_hash)
+        temp_path = summary_path + ".tmp"
+        with open(temp_path, "w") as summary_file:
+            json.dump(replay_summary, summary_file, separators=(",", ":"))
+        os.replace(temp_path, summary_path)
+
+    def insert_replay_data(
+        self, replay_data: BinaryIO, replay_hash: Optional[str] = None
+    ) -> Optional[Replay]:
+        # Hash while copying to a temporary file, so the data is only read once
+        temp_file_descriptor, temp_path = tempfile.mkstemp(
+            suffix=".tmp", dir=self.archive_path
+        )
+        try:
+            hash_calculator = hashlib.sha256()
+            with os.fdopen(temp_file_descriptor, "wb") as temp_file:
+                for buf in iter(
+                    functools.partial(
+                        replay_data.read, ReplayArchive._COPY_BUFFER_SIZE
+                    ),
+                    b"",
+                ):
+                    hash_calculator.update(buf)
+                    temp_file.write(buf)
+
+            calculated_hash = hash_calculator.hexdigest()
+            if replay_hash and calculated_hash != replay_hash:
+                return None
+
+            canonical_path = self.get_replay_path(calculated_hash)
+            if not os.path.exists(canonical_path):
+                os.replace(temp_path, canonical_path)
+
+            return Replay(canonical_path, calculated_hash)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def archive_replay(self, replay: Replay) -> str:
+        canonical_path = self.get_replay_path(replay.replay_hash)
+        if canonical_path != replay.path:
+            shutil.copyfile(replay.path, canonical_path)
+        return canonical_path
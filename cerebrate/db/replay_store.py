@@ -1,6 +1,18 @@
+import contextlib
 import os
-import shutil
-from typing import BinaryIO, Final, List, Optional, Any, Dict
+import threading
+from collections import Counter
+from typing import (
+    BinaryIO,
+    Final,
+    List,
+    Optional,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    Tuple,
+)
 
 import tinydb
 import tinydb.table
@@ -8,6 +20,13 @@ import tinydb.table
 from cerebrate.core.replay import Replay, Team
 from cerebrate.core.replay_query import ReplayQuery
 
+from .player_team_index import PlayerTeamIndex
+from .replay_archive import ReplayArchive
+from .replay_store_snapshot import ReplayStoreSnapshot
+from .storage import AtomicJSONStorage
+from .tag_index import TagIndex
+from .timestamp_index import TimestampIndex
+
 
 def _replay_from_doc(doc: dict) -> Replay:
     doc_teams = doc.get("teams", [])
@@ -27,150 +46,387 @@ def _replay_from_doc(doc: dict) -> Replay:
         timestamp=doc.get("timestamp"),
         player_team=doc.get("player_team"),
         opponent_team=doc.get("opponent_team"),
+        pipeline_version=doc.get("pipeline_version"),
     )
 
 
-def _make_db_query(query: ReplayQuery) -> tinydb.Query:
-    include_tags_set = set(query.include_tags)
-    exclude_tags_set = set(query.exclude_tags)
+def _make_doc(replay: Replay, canonical_path: str) -> Dict[str, Any]:
+    return {
+        "hash": replay.replay_hash,
+        "canonical_path": canonical_path,
+        "tags": replay.tags.to_list(),
+        "notes": replay.notes,
+        "teams": [team.team_id for team in replay.teams],
+        "team_names": [team.name for team in replay.teams],
+        "timestamp": replay.timestamp,
+        "player_team": replay.player_team,
+        "opponent_team": replay.opponent_team,
+        "pipeline_version": replay.pipeline_version,
+    }
+
+
+def _make_update_fields(replay: Replay, overwrite_all: bool) -> Dict[str, Any]:
+    return {
+        "tags": replay.tags.to_list(),
+        "notes": replay.notes,
+        **(
+            {"player_team": replay.player_team}
+            if replay.player_team is not None
+            else {}
+        ),
+        **(
+            {"opponent_team": replay.opponent_team}
+            if replay.opponent_team is not None
+            else {}
+        ),
+        **(
+            {"pipeline_version": replay.pipeline_version}
+            if replay.pipeline_version is not None
+            else {}
+        ),
+        **(
+            {
+                "canonical_path": replay.path,
+                "teams": [team.team_id for team in replay.teams],
+                "team_names": [team.name for team in replay.teams],
+                "timestamp": replay.timestamp,
+            }
+            if overwrite_all
+            else {}
+        ),
+    }
 
-    doc = tinydb.Query()
-    db_query = doc["tags"].test(
-        lambda replay_tags: replay_tags
-        and (not include_tags_set or include_tags_set.issubset(replay_tags))
-        and (not exclude_tags_set or not exclude_tags_set.intersection(replay_tags))
-    )
-    if None not in [query.start_timestamp, query.end_timestamp]:
-        db_query = (
-            db_query
-            & (doc["timestamp"] >= query.start_timestamp)
-            & (doc["timestamp"] <= query.end_timestamp)
-        )
 
-    return db_query
+def _get_doc_player_team_id(doc: dict) -> Optional[str]:
+    teams = doc.get("teams")
+    player_team = doc.get("player_team")
+    if not teams or player_team is None:
+        return None
+
+    if len(teams) <= player_team or player_team == doc.get("opponent_team"):
+        return None
+
+    return teams[player_team]
 
 
 class ReplayStore:
     _REPLAY_ARCHIVE_SUBDIRECTORY_NAME: Final = "replay_archive"
     _DB_FILE_NAME: Final = "replays.json"
+    _TAG_INDEX_FILE_NAME: Final = "tag_index.json"
+
+    DEFAULT_MAX_UNFLUSHED_WRITES: Final = 50
+    DEFAULT_FLUSH_INTERVAL_SECONDS: Final = 1.0
+
+    @staticmethod
+    def get_db_path(db_data_path: str) -> str:
+        return os.path.join(db_data_path, ReplayStore._DB_FILE_NAME)
 
-    def __init__(self, db_data_path: str):
+    def __init__(
+        self,
+        db_data_path: str,
+        max_unflushed_writes: int = DEFAULT_MAX_UNFLUSHED_WRITES,
+        flush_interval_seconds: Optional[float] = DEFAULT_FLUSH_INTERVAL_SECONDS,
+    ):
         if not os.path.exists(db_data_path):
             os.makedirs(db_data_path)
 
-        replay_archive_path = os.path.join(
-            db_data_path, ReplayStore._REPLAY_ARCHIVE_SUBDIRECTORY_NAME
-        )
-        if not os.path.exists(replay_archive_path):
-            os.makedirs(replay_archive_path)
-
-        db_path = os.path.join(db_data_path, ReplayStore._DB_FILE_NAME)
+        db_path = ReplayStore.get_db_path(db_data_path)
         if not os.path.exists(db_path):
             open(db_path, "a").close()
 
-        self._db: Final[tinydb.TinyDB] = tinydb.TinyDB(db_path)
+        # The store is created on the main thread but used from other threads
+        self._lock: Final[threading.RLock] = threading.RLock()
+        # Edits are written to disk behind, a few at a time
+        self._db: Final[tinydb.TinyDB] = tinydb.TinyDB(
+            db_path,
+            storage=AtomicJSONStorage,
+            max_unflushed_writes=max_unflushed_writes,
+            flush_interval_seconds=flush_interval_seconds,
+            lock=self._lock,
+        )
+        self._storage: Final[AtomicJSONStorage] = self._db.storage
         self._table: Final[tinydb.table.Table] = self._db.table(
             tinydb.TinyDB.default_table_name
         )
-        self._replay_archive_path: Final[str] = replay_archive_path
+        self._replay_archive: Final[ReplayArchive] = ReplayArchive(
+            os.path.join(db_data_path, ReplayStore._REPLAY_ARCHIVE_SUBDIRECTORY_NAME)
+        )
+        self._db_path: Final[str] = db_path
+
+        self._tag_index_path: Final[str] = os.path.join(
+            db_data_path, ReplayStore._TAG_INDEX_FILE_NAME
+        )
+        self._tag_index: Final[TagIndex] = TagIndex()
+        if not self._tag_index.load(self._tag_index_path, self._db_signature()):
+            self._rebuild_tag_index()
+
+        docs = self._table.all()
+        # Point reads and writes go straight to the document instead of scanning
+        # the table for its hash
+        self._doc_ids: Final[Dict[str, int]] = {doc["hash"]: doc.doc_id for doc in docs}
+        self._player_team_index: Final[PlayerTeamIndex] = PlayerTeamIndex()
+        self._player_team_index.rebuild(
+            (doc["hash"], _get_doc_player_team_id(doc)) for doc in docs
+        )
+        self._timestamp_index: Final[TimestampIndex] = TimestampIndex()
+        self._timestamp_index.rebuild(
+            (doc["hash"], doc.get("timestamp")) for doc in docs
+        )
+
+    def _get_raw_docs(self) -> Dict[str, dict]:
+        """returns the documents as held by the storage, by stringified doc id"""
+
+        # TinyDB rebuilds the whole table on every get, update and remove, even by
+        # doc id, so point reads and writes use the storage's tables directly
+        tables = self._storage.read()
+        return tables.get(self._table.name, {}) if tables else {}
+
+    def _write_raw_docs(self):
+        self._table.clear_cache()
+        self._storage.write(self._storage.read())
+
+    def _db_signature(self) -> Optional[List[int]]:
+        try:
+            stat = os.stat(self._db_path)
+        except OSError:
+            return None
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def _rebuild_tag_index(self):
+        self._tag_index.rebuild(
+            (doc["hash"], doc.get("tags") or []) for doc in self._table.all()
+        )
+
+    def flush(self):
+        """writes any edits not yet written to disk"""
+
+        self._storage.flush()
+
+    def close(self):
+        with self._lock:
+            # The index is signed with the database as it is once flushed
+            self._storage.flush()
+            self._tag_index.save(self._tag_index_path, self._db_signature())
+            self._db.close()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """writes the database to disk once, when the outermost batch exits"""
+
+        with self._lock:
+            self._storage.begin_batch()
+            try:
+                yield self
+            finally:
+                self._storage.end_batch()
 
     def insert_replay_data(
         self, replay_data: BinaryIO, replay_hash: Optional[str] = None
     ) -> Optional[Replay]:
-        calculated_hash = Replay.hash_replay_data(replay_data)
-        if replay_hash and calculated_hash != replay_hash:
+        replay = self._replay_archive.insert_replay_data(replay_data, replay_hash)
+        if not replay:
             return None
-        replay_data.seek(0)
 
-        canonical_path = os.path.join(
-            self._replay_archive_path, calculated_hash + ".SC2Replay"
-        )
-        with open(canonical_path, "wb") as replay_file:
-            shutil.copyfileobj(replay_data, replay_file)
+        return self.find_replay_by_hash(replay.replay_hash) or replay
 
-        return Replay(canonical_path, calculated_hash)
+    def find_archived_replay(self, replay_hash: str) -> Optional[Replay]:
+        """returns the saved replay, or a new one if only its data was archived"""
 
-    def update_or_insert_replay(self, replay: Replay, overwrite_all: bool = False):
-        fields: Dict[str, Any] = {
-            "tags": replay.tags,
-            "notes": replay.notes,
-            **(
-                {"player_team": replay.player_team}
-                if replay.player_team is not None
-                else {}
-            ),
-            **(
-                {"opponent_team": replay.opponent_team}
-                if replay.opponent_team is not None
-                else {}
-            ),
-            **(
-                {
-                    "canonical_path": replay.path,
-                    "teams": [team.team_id for team in replay.teams],
-                    "team_names": [team.name for team in replay.teams],
-                    "timestamp": replay.timestamp,
-                }
-                if overwrite_all
-                else {}
-            ),
-        }
-
-        replay_updated = self._table.update(
-            fields, tinydb.Query()["hash"] == replay.replay_hash
+        replay_path = self._replay_archive.find_replay_path(replay_hash)
+        if not replay_path:
+            return None
+
+        return self.find_replay_by_hash(replay_hash) or Replay(replay_path, replay_hash)
+
+    def load_replay_summary(self, replay_hash: str) -> Optional[dict]:
+        return self._replay_archive.load_replay_summary(replay_hash)
+
+    def save_replay_summary(self, replay_hash: str, replay_summary: dict):
+        self._replay_archive.save_replay_summary(replay_hash, replay_summary)
+
+    def create_snapshot(self) -> ReplayStoreSnapshot:
+        return ReplayStoreSnapshot(
+            self.get_replay_player_team_ids(), self._replay_archive
         )
-        if not replay_updated:
-            canonical_path = os.path.join(
-                self._replay_archive_path, replay.replay_hash + ".SC2Replay"
+
+    def update_or_insert_replay(self, replay: Replay, overwrite_all: bool = False):
+        self.update_or_insert_replays([replay], overwrite_all)
+
+    def update_or_insert_replays(
+        self, replays: Iterable[Replay], overwrite_all: bool = False
+    ):
+        with self._lock:
+            replays_by_hash = {replay.replay_hash: replay for replay in replays}
+            if not replays_by_hash:
+                return
+
+            raw_docs = self._get_raw_docs()
+            is_updated = False
+            for replay_hash, replay in replays_by_hash.items():
+                doc_id = self._doc_ids.get(replay_hash)
+                if doc_id is None:
+                    continue
+
+                doc = raw_docs[str(doc_id)]
+                doc.update(_make_update_fields(replay, overwrite_all))
+                self._player_team_index.set_player_team_id(
+                    replay_hash, _get_doc_player_team_id(doc)
+                )
+                self._timestamp_index.set_timestamp(replay_hash, doc.get("timestamp"))
+                is_updated = True
+            if is_updated:
+                self._write_raw_docs()
+
+            new_docs = [
+                _make_doc(replay, self._replay_archive.archive_replay(replay))
+                for replay_hash, replay in replays_by_hash.items()
+                if replay_hash not in self._doc_ids
+            ]
+            if new_docs:
+                for doc, doc_id in zip(new_docs, self._table.insert_multiple(new_docs)):
+                    self._doc_ids[doc["hash"]] = doc_id
+            for doc in new_docs:
+                self._player_team_index.set_player_team_id(
+                    doc["hash"], _get_doc_player_team_id(doc)
+                )
+                self._timestamp_index.set_timestamp(doc["hash"], doc["timestamp"])
+
+            for replay_hash, replay in replays_by_hash.items():
+                self._tag_index.set_tags(replay_hash, replay.tags)
+
+    def has_replay(self, replay_hash: str) -> bool:
+        return replay_hash in self._timestamp_index
+
+    def find_replay_by_hash(self, replay_hash: str) -> Optional[Replay]:
+        with self._lock:
+            doc_id = self._doc_ids.get(replay_hash)
+            if doc_id is None:
+                return None
+
+            result = self._get_raw_docs().get(str(doc_id))
+            return _replay_from_doc(result) if result else None
+
+    def _query_replay_hashes(self, query: ReplayQuery) -> List[str]:
+        """returns the hashes of replays matching the query, in the query's order"""
+
+        return list(self._iter_query_replay_hashes(query))
+
+    def _iter_query_replay_hashes(self, query: ReplayQuery) -> Iterator[str]:
+        replay_hashes = self._tag_index.query(query.include_tags, query.exclude_tags)
+        if not replay_hashes:
+            return iter([])
+
+        # Sorting a few matches beats walking every replay in the date range
+        if len(replay_hashes) < self._timestamp_index.count_replay_hashes(
+            query.start_timestamp, query.end_timestamp
+        ):
+            return iter(
+                self._timestamp_index.sort_replay_hashes(
+                    replay_hashes,
+                    query.start_timestamp,
+                    query.end_timestamp,
+                    query.is_newest_first,
+                )
             )
-            if canonical_path != replay.path:
-                shutil.copyfile(replay.path, canonical_path)
-            self._table.insert(
-                {
-                    "hash": replay.replay_hash,
-                    "canonical_path": canonical_path,
-                    "tags": replay.tags,
-                    "notes": replay.notes,
-                    "teams": [team.team_id for team in replay.teams],
-                    "team_names": [team.name for team in replay.teams],
-                    "timestamp": replay.timestamp,
-                    "player_team": replay.player_team,
-                    "opponent_team": replay.opponent_team,
-                }
+
+        return (
+            replay_hash
+            for replay_hash in self._timestamp_index.iter_replay_hashes(
+                query.start_timestamp, query.end_timestamp, query.is_newest_first
             )
+            if replay_hash in replay_hashes
+        )
 
-    def find_replay_by_hash(self, replay_hash: str) -> Optional[Replay]:
-        result = self._table.get(tinydb.where("hash") == replay_hash)
-        return _replay_from_doc(result) if result else None
+    def _find_docs_in_order(self, replay_hashes: List[str]) -> List[dict]:
+        if not replay_hashes:
+            return []
+
+        raw_docs = self._get_raw_docs()
+        docs = [
+            raw_docs.get(str(self._doc_ids[replay_hash]))
+            for replay_hash in replay_hashes
+            if replay_hash in self._doc_ids
+        ]
+        return [doc for doc in docs if doc]
 
     def query_replays(self, query: ReplayQuery) -> List[Replay]:
-        docs = self._table.search(_make_db_query(query))
-        replays = [_replay_from_doc(doc) for doc in docs]
-        replays.sort(key=lambda replay: replay.timestamp, reverse=True)
-        return replays
+        # Only the requested page is turned into replays
+        with self._lock:
+            page_hashes = query.get_page(self._iter_query_replay_hashes(query))
+            return [
+                _replay_from_doc(doc) for doc in self._find_docs_in_order(page_hashes)
+            ]
+
+    def count_replays(self, query: ReplayQuery) -> int:
+        with self._lock:
+            if None in [query.start_timestamp, query.end_timestamp]:
+                return len(
+                    self._tag_index.query(query.include_tags, query.exclude_tags)
+                )
+
+            return len(self._query_replay_hashes(query))
+
+    def count_tags(self, query: ReplayQuery) -> Counter:
+        """returns the number of replays matching the query with each tag"""
+
+        with self._lock:
+            replay_hashes = self._tag_index.query(
+                query.include_tags, query.exclude_tags
+            )
+            if replay_hashes and None not in [
+                query.start_timestamp,
+                query.end_timestamp,
+            ]:
+                replay_hashes = set(self._query_replay_hashes(query))
+
+            return self._tag_index.count_tags(replay_hashes)
 
     def all_replays(self) -> List[Replay]:
-        replays = [_replay_from_doc(doc) for doc in self._table.all()]
-        replays.sort(key=lambda replay: replay.timestamp, reverse=True)
-        return replays
+        with self._lock:
+            docs_by_hash = {doc["hash"]: doc for doc in self._get_raw_docs().values()}
+            return [
+                _replay_from_doc(docs_by_hash[replay_hash])
+                for replay_hash in self._timestamp_index.get_replay_hashes()
+                if replay_hash in docs_by_hash
+            ]
+
+    def find_replays_by_hashes(self, replay_hashes: Iterable[str]) -> List[Replay]:
+        """returns the saved replays with the given hashes, in the given order"""
+
+        with self._lock:
+            return [
+                _replay_from_doc(doc)
+                for doc in self._find_docs_in_order(list(replay_hashes))
+            ]
 
     def remove_replay_by_hash(self, replay_hash: str):
-        self._table.remove(tinydb.where("hash") == replay_hash)
+        self.remove_replays_by_hashes([replay_hash])
+
+    def remove_replays_by_hashes(self, replay_hashes: Iterable[str]):
+        replay_hash_set = set(replay_hashes)
+        if not replay_hash_set:
+            return
+
+        with self._lock:
+            removed_doc_ids = [
+                self._doc_ids.pop(replay_hash)
+                for replay_hash in replay_hash_set
+                if replay_hash in self._doc_ids
+            ]
+            if removed_doc_ids:
+                raw_docs = self._get_raw_docs()
+                for doc_id in removed_doc_ids:
+                    raw_docs.pop(str(doc_id), None)
+                # A single write of the database
+                self._write_raw_docs()
+            for replay_hash in replay_hash_set:
+                self._tag_index.remove(replay_hash)
+                self._player_team_index.remove(replay_hash)
+                self._timestamp_index.remove(replay_hash)
 
     def get_replay_player_team_ids(self) -> List[str]:
-        result = self._table.search(
-            (tinydb.where("player_team") != None) & (tinydb.where("teams") != None)
-        )
+        with self._lock:
+            return list(self._player_team_index)
 
-        is_valid_doc = (
-            lambda doc: doc["teams"]
-            and len(doc["teams"]) > doc["player_team"]
-            and doc["player_team"] is not doc["opponent_team"]
-        )
-        return list(
-            set(
-                document["teams"][document["player_team"]]
-                for document in result
-                if is_valid_doc(document)
-            )
-        )
+    def is_known_player_team_id(self, team_id: str) -> bool:
+        return team_id in self._player_team_index
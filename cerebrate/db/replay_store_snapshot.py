@@ -0,0 +1,26 @@
+from typing import FrozenSet, Iterable, List, Final, Optional
+
+from .replay_archive import ReplayArchive
+
+
+class ReplayStoreSnapshot:
+    # A picklable, read-only view of the replay store state the processing
+    # pipeline needs, for use in worker processes that can't share the store.
+
+    player_team_ids: Final[FrozenSet[str]]
+
+    def __init__(self, player_team_ids: Iterable[str], replay_archive: ReplayArchive):
+        self.player_team_ids = frozenset(player_team_ids)
+        self._replay_archive: Final[ReplayArchive] = replay_archive
+
+    def get_replay_player_team_ids(self) -> List[str]:
+        return list(self.player_team_ids)
+
+    def is_known_player_team_id(self, team_id: str) -> bool:
+        return team_id in self.player_team_ids
+
+    def load_replay_summary(self, replay_hash: str) -> Optional[dict]:
+        return self._replay_archive.load_replay_summary(replay_hash)
+
+    def save_replay_summary(self, replay_hash: str, replay_summary: dict):
+        self._replay_archive.save_replay_summary(replay_hash, replay_summary)
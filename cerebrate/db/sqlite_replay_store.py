@@ -0,0 +1,430 @@
+import contextlib
+import os
+from collections import Counter
+import sqlite3
+import threading
+from typing import BinaryIO, Dict, Final, Iterable, List, Optional, Tuple, Any
+
+from cerebrate.core.replay import Replay, Team
+from cerebrate.core.replay_query import ReplayQuery
+
+from .player_team_index import PlayerTeamIndex
+from .replay_archive import ReplayArchive
+from .replay_store_snapshot import ReplayStoreSnapshot
+
+# Each entry migrates the schema from version (index) to version (index + 1)
+_SCHEMA_MIGRATIONS: Final[List[str]] = [
+    """
+    CREATE TABLE replays (
+        hash TEXT PRIMARY KEY,
+        canonical_path TEXT NOT NULL,
+        notes TEXT NOT NULL DEFAULT '',
+        timestamp INTEGER,
+        player_team INTEGER,
+        opponent_team INTEGER
+    );
+    CREATE INDEX replays_timestamp ON replays (timestamp);
+
+    CREATE TABLE teams (
+        replay_hash TEXT NOT NULL REFERENCES replays (hash) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        team_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        PRIMARY KEY (replay_hash, position)
+    );
+    CREATE INDEX teams_team_id ON teams (team_id);
+
+    CREATE TABLE replay_tags (
+        replay_hash TEXT NOT NULL REFERENCES replays (hash) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        tag TEXT NOT NULL,
+        PRIMARY KEY (replay_hash, position)
+    );
+    CREATE INDEX replay_tags_tag ON replay_tags (tag, replay_hash);
+    """,
+    """
+    ALTER TABLE replays ADD COLUMN pipeline_version TEXT;
+    """,
+]
+
+_REPLAY_COLUMNS: Final = (
+    "r.hash, r.canonical_path, r.notes, r.timestamp, r.player_team, "
+    "r.opponent_team, r.pipeline_version"
+)
+
+_PLAYER_TEAM_JOIN_CLAUSE: Final = (
+    "JOIN teams t ON t.replay_hash = r.hash AND t.position = r.player_team "
+    "WHERE (r.opponent_team IS NULL OR r.opponent_team != r.player_team)"
+)
+
+_MAX_HASHES_PER_STATEMENT: Final = 500
+
+
+def _make_where_clause(query: ReplayQuery) -> Tuple[str, List[Any]]:
+    include_tags = list(dict.fromkeys(query.include_tags))
+    exclude_tags = list(dict.fromkeys(query.exclude_tags))
+
+    clauses = ["EXISTS (SELECT 1 FROM replay_tags t WHERE t.replay_hash = r.hash)"]
+    params: List[Any] = []
+
+    if include_tags:
+        clauses.append(
+            "r.hash IN (SELECT replay_hash FROM replay_tags WHERE tag IN ({}) "
+            "GROUP BY replay_hash HAVING COUNT(DISTINCT tag) = ?)".format(
+                ", ".join("?" * len(include_tags))
+            )
+        )
+        params.extend(include_tags)
+        params.append(len(include_tags))
+
+    if exclude_tags:
+        clauses.append(
+            "NOT EXISTS (SELECT 1 FROM replay_tags t "
+            "WHERE t.replay_hash = r.hash AND t.tag IN ({}))".format(
+                ", ".join("?" * len(exclude_tags))
+            )
+        )
+        params.extend(exclude_tags)
+
+    if None not in [query.start_timestamp, query.end_timestamp]:
+        clauses.append("r.timestamp >= ? AND r.timestamp <= ?")
+        params.extend([query.start_timestamp, query.end_timestamp])
+
+    return " AND ".join(clauses), params
+
+
+class SqliteReplayStore:
+    _REPLAY_ARCHIVE_SUBDIRECTORY_NAME: Final = "replay_archive"
+    _DB_FILE_NAME: Final = "replays.sqlite3"
+
+    @staticmethod
+    def get_db_path(db_data_path: str) -> str:
+        return os.path.join(db_data_path, SqliteReplayStore._DB_FILE_NAME)
+
+    def __init__(self, db_data_path: str, db_path: Optional[str] = None):
+        if not os.path.exists(db_data_path):
+            os.makedirs(db_data_path)
+
+        self._replay_archive: Final[ReplayArchive] = ReplayArchive(
+            os.path.join(
+                db_data_path, SqliteReplayStore._REPLAY_ARCHIVE_SUBDIRECTORY_NAME
+            )
+        )
+
+        # The store is created on the main thread but used from the web server thread
+        self._lock: Final[threading.RLock] = threading.RLock()
+        self._connection: Final[sqlite3.Connection] = sqlite3.connect(
+            db_path or SqliteReplayStore.get_db_path(db_data_path),
+            check_same_thread=False,
+        )
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        self._migrate_schema()
+
+        self._player_team_index: Final[PlayerTeamIndex] = PlayerTeamIndex()
+        with self._lock:
+            self._player_team_index.rebuild(
+                self._connection.execute(
+                    "SELECT r.hash, t.team_id FROM replays r "
+                    + _PLAYER_TEAM_JOIN_CLAUSE
+                ).fetchall()
+            )
+
+    def _migrate_schema(self):
+        with self._lock:
+            (schema_version,) = self._connection.execute(
+                "PRAGMA user_version"
+            ).fetchone()
+            for version in range(schema_version, len(_SCHEMA_MIGRATIONS)):
+                self._connection.executescript(
+                    "BEGIN;\n{}\nPRAGMA user_version = {};\nCOMMIT;".format(
+                        _SCHEMA_MIGRATIONS[version], version + 1
+                    )
+                )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def flush(self):
+        # Every write is committed as it's made
+        pass
+
+    @contextlib.contextmanager
+    def batch(self):
+        # Writes are already incremental, a batch only keeps other threads'
+        # writes from interleaving with it
+        with self._lock:
+            yield self
+
+    def insert_replay_data(
+        self, replay_data: BinaryIO, replay_hash: Optional[str] = None
+    ) -> Optional[Replay]:
+        replay = self._replay_archive.insert_replay_data(replay_data, replay_hash)
+        if not replay:
+            return None
+
+        return self.find_replay_by_hash(replay.replay_hash) or replay
+
+    def find_archived_replay(self, replay_hash: str) -> Optional[Replay]:
+        """returns the saved replay, or a new one if only its data was archived"""
+
+        replay_path = self._replay_archive.find_replay_path(replay_hash)
+        if not replay_path:
+            return None
+
+        return self.find_replay_by_hash(replay_hash) or Replay(replay_path, replay_hash)
+
+    def load_replay_summary(self, replay_hash: str) -> Optional[dict]:
+        return self._replay_archive.load_replay_summary(replay_hash)
+
+    def save_replay_summary(self, replay_hash: str, replay_summary: dict):
+        self._replay_archive.save_replay_summary(replay_hash, replay_summary)
+
+    def create_snapshot(self) -> ReplayStoreSnapshot:
+        return ReplayStoreSnapshot(
+            self.get_replay_player_team_ids(), self._replay_archive
+        )
+
+    def update_or_insert_replay(self, replay: Replay, overwrite_all: bool = False):
+        self.update_or_insert_replays([replay], overwrite_all)
+
+    def update_or_insert_replays(
+        self, replays: Iterable[Replay], overwrite_all: bool = False
+    ):
+        with self._lock, self._connection:
+            for replay in replays:
+                self._update_or_insert_replay(replay, overwrite_all)
+
+    def _update_or_insert_replay(self, replay: Replay, overwrite_all: bool):
+        cursor = self._connection.execute(
+            "UPDATE replays SET notes = ?, "
+            "player_team = COALESCE(?, player_team), "
+            "opponent_team = COALESCE(?, opponent_team), "
+            "pipeline_version = COALESCE(?, pipeline_version) "
+            "WHERE hash = ?",
+            (
+                replay.notes,
+                replay.player_team,
+                replay.opponent_team,
+                replay.pipeline_version,
+                replay.replay_hash,
+            ),
+        )
+        if cursor.rowcount:
+            if overwrite_all:
+                self._connection.execute(
+                    "UPDATE replays SET canonical_path = ?, timestamp = ? "
+                    "WHERE hash = ?",
+                    (replay.path, replay.timestamp, replay.replay_hash),
+                )
+                self._set_teams(replay)
+        else:
+            canonical_path = self._replay_archive.archive_replay(replay)
+            self._connection.execute(
+                "INSERT INTO replays (hash, canonical_path, notes, timestamp, "
+                "player_team, opponent_team, pipeline_version) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    replay.replay_hash,
+                    canonical_path,
+                    replay.notes,
+                    replay.timestamp,
+                    replay.player_team,
+                    replay.opponent_team,
+                    replay.pipeline_version,
+                ),
+            )
+            self._set_teams(replay)
+
+        self._set_tags(replay)
+
+        row = self._connection.execute(
+            "SELECT t.team_id FROM replays r "
+            + _PLAYER_TEAM_JOIN_CLAUSE
+            + " AND r.hash = ?",
+            (replay.replay_hash,),
+        ).fetchone()
+        self._player_team_index.set_player_team_id(
+            replay.replay_hash, row[0] if row else None
+        )
+
+    def _set_teams(self, replay: Replay):
+        self._connection.execute(
+            "DELETE FROM teams WHERE replay_hash = ?", (replay.replay_hash,)
+        )
+        self._connection.executemany(
+            "INSERT INTO teams (replay_hash, position, team_id, name) "
+            "VALUES (?, ?, ?, ?)",
+            [
+                (replay.replay_hash, position, team.team_id, team.name)
+                for position, team in enumerate(replay.teams)
+            ],
+        )
+
+    def _set_tags(self, replay: Replay):
+        self._connection.execute(
+            "DELETE FROM replay_tags WHERE replay_hash = ?", (replay.replay_hash,)
+        )
+        self._connection.executemany(
+            "INSERT INTO replay_tags (replay_hash, position, tag) VALUES (?, ?, ?)",
+            [
+                (replay.replay_hash, position, tag)
+                for position, tag in enumerate(replay.tags)
+            ],
+        )
+
+    def has_replay(self, replay_hash: str) -> bool:
+        with self._lock:
+            return (
+                self._connection.execute(
+                    "SELECT 1 FROM replays WHERE hash = ?", (replay_hash,)
+                ).fetchone()
+                is not None
+            )
+
+    def find_replay_by_hash(self, replay_hash: str) -> Optional[Replay]:
+        replays = self._select_replays("r.hash = ?", [replay_hash])
+        return replays[0] if replays else None
+
+    def query_replays(self, query: ReplayQuery) -> List[Replay]:
+        where_clause, params = _make_where_clause(query)
+        return self._select_replays(
+            where_clause,
+            params,
+            newest_first=query.is_newest_first,
+            limit=query.limit,
+            offset=query.offset,
+        )
+
+    def count_replays(self, query: ReplayQuery) -> int:
+        where_clause, params = _make_where_clause(query)
+        with self._lock:
+            (count,) = self._connection.execute(
+                "SELECT COUNT(*) FROM replays r WHERE " + where_clause, params
+            ).fetchone()
+        return count
+
+    def count_tags(self, query: ReplayQuery) -> Counter:
+        """returns the number of replays matching the query with each tag"""
+
+        where_clause, params = _make_where_clause(query)
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT tag, COUNT(DISTINCT replay_hash) FROM replay_tags "
+                "WHERE replay_hash IN (SELECT r.hash FROM replays r WHERE {}) "
+                "GROUP BY tag".format(where_clause),
+                params,
+            ).fetchall()
+        return Counter(dict(rows))
+
+    def all_replays(self) -> List[Replay]:
+        return self._select_replays("1", [])
+
+    def find_replays_by_hashes(self, replay_hashes: Iterable[str]) -> List[Replay]:
+        """returns the saved replays with the given hashes, in the given order"""
+
+        replay_hashes = list(replay_hashes)
+        replays_by_hash: Dict[str, Replay] = {}
+        # Hashes are selected in chunks to stay under sqlite's parameter limit
+        for start in range(0, len(replay_hashes), _MAX_HASHES_PER_STATEMENT):
+            chunk = replay_hashes[start : start + _MAX_HASHES_PER_STATEMENT]
+            for replay in self._select_replays(
+                "r.hash IN ({})".format(", ".join("?" * len(chunk))), chunk
+            ):
+                replays_by_hash[replay.replay_hash] = replay
+
+        return [
+            replays_by_hash[replay_hash]
+            for replay_hash in replay_hashes
+            if replay_hash in replays_by_hash
+        ]
+
+    def remove_replay_by_hash(self, replay_hash: str):
+        self.remove_replays_by_hashes([replay_hash])
+
+    def remove_replays_by_hashes(self, replay_hashes: Iterable[str]):
+        replay_hash_set = set(replay_hashes)
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "DELETE FROM replays WHERE hash = ?",
+                [(replay_hash,) for replay_hash in replay_hash_set],
+            )
+            for replay_hash in replay_hash_set:
+                self._player_team_index.remove(replay_hash)
+
+    def get_replay_player_team_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._player_team_index)
+
+    def is_known_player_team_id(self, team_id: str) -> bool:
+        return team_id in self._player_team_index
+
+    def _select_replays(
+        self,
+        where_clause: str,
+        params: List[Any],
+        newest_first: bool = True,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[Replay]:
+        # NULL timestamps sort as the oldest, the hash keeps pages stable
+        page_clause = "ORDER BY r.timestamp {0}, r.hash {0} LIMIT ? OFFSET ?".format(
+            "DESC" if newest_first else "ASC"
+        )
+        params = params + [-1 if limit is None else limit, offset]
+        matching_hashes = "SELECT r.hash FROM replays r WHERE {} {}".format(
+            where_clause, page_clause
+        )
+
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT {} FROM replays r WHERE {} {}".format(
+                    _REPLAY_COLUMNS, where_clause, page_clause
+                ),
+                params,
+            ).fetchall()
+
+            tags: Dict[str, List[str]] = {}
+            for replay_hash, tag in self._connection.execute(
+                "SELECT replay_hash, tag FROM replay_tags "
+                "WHERE replay_hash IN ({}) ORDER BY replay_hash, position".format(
+                    matching_hashes
+                ),
+                params,
+            ):
+                tags.setdefault(replay_hash, []).append(tag)
+
+            teams: Dict[str, List[Team]] = {}
+            for replay_hash, team_id, name in self._connection.execute(
+                "SELECT replay_hash, team_id, name FROM teams "
+                "WHERE replay_hash IN ({}) ORDER BY replay_hash, position".format(
+                    matching_hashes
+                ),
+                params,
+            ):
+                teams.setdefault(replay_hash, []).append(Team(team_id, name))
+
+        return [
+            Replay(
+                path=canonical_path,
+                replay_hash=replay_hash,
+                tags=tags.get(replay_hash),
+                notes=notes,
+                teams=teams.get(replay_hash),
+                timestamp=timestamp,
+                player_team=player_team,
+                opponent_team=opponent_team,
+                pipeline_version=pipeline_version,
+            )
+            for (
+                replay_hash,
+                canonical_path,
+                notes,
+                timestamp,
+                player_team,
+                opponent_team,
+                pipeline_version,
+            ) in rows
+        ]
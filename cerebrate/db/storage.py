@@ -0,0 +1,186 @@
+import json
+import os
+import stat
+import tempfile
+import threading
+from typing import Any, Dict, Final, Optional, Tuple
+
+import tinydb.storages
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_Tables = Dict[str, Dict[str, Any]]
+# (st_mtime_ns, st_size)
+_FileSignature = Tuple[int, int]
+
+
+class DatabaseModifiedError(RuntimeError):
+    pass
+
+
+def _dumps(data: _Tables) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode()
+
+
+def _loads(serialized: bytes) -> _Tables:
+    if orjson is not None:
+        return orjson.loads(serialized)
+    return json.loads(serialized)
+
+
+class AtomicJSONStorage(tinydb.storages.Storage):
+    # TinyDB storage in the same format as tinydb's JSONStorage. The parsed
+    # database is kept in memory, and writes are flushed behind after
+    # max_unflushed_writes writes or flush_interval_seconds, whichever comes
+    # first. The database is written to a temporary file which then replaces the
+    # old one, so a crash mid-write never leaves a truncated database behind.
+    # While a batch is open, only the final state is written, once. A flush
+    # fails rather than overwrite a file another process wrote to since it was
+    # loaded.
+
+    _data: Optional[_Tables]
+    _file_signature: Optional[_FileSignature]
+    _flush_timer: Optional[threading.Timer]
+
+    def __init__(
+        self,
+        path: str,
+        max_unflushed_writes: int = 1,
+        flush_interval_seconds: Optional[float] = None,
+        lock: Optional[threading.RLock] = None,
+    ):
+        super().__init__()
+        self.path: Final[str] = path
+        self._max_unflushed_writes: Final[int] = max(max_unflushed_writes, 1)
+        self._flush_interval_seconds: Final[Optional[float]] = flush_interval_seconds
+        # The lock guarding the tables, shared with the owner of the database as
+        # TinyDB modifies the tables in place between reads and writes
+        self._lock: Final[threading.RLock] = lock or threading.RLock()
+
+        self._data = None
+        self._file_signature = None
+        self._is_loaded = False
+        self._unflushed_writes = 0
+        self._batch_depth = 0
+        self._flush_timer = None
+
+    @property
+    def is_in_batch(self) -> bool:
+        return self._batch_depth > 0
+
+    @property
+    def is_dirty(self) -> bool:
+        return self._unflushed_writes > 0
+
+    def begin_batch(self):
+        with self._lock:
+            self._batch_depth += 1
+
+    def end_batch(self):
+        with self._lock:
+            self._batch_depth -= 1
+            if not self.is_in_batch:
+                self.flush()
+
+    def read(self) -> Optional[_Tables]:
+        with self._lock:
+            if not self._is_loaded:
+                self._data = self._read_file()
+                self._is_loaded = True
+            return self._data
+
+    def write(self, data: _Tables):
+        with self._lock:
+            if not self._is_loaded:
+                self._file_signature = self._get_file_signature()
+                self._is_loaded = True
+            self._data = data
+            self._unflushed_writes += 1
+
+            if self.is_in_batch:
+                return
+            if self._unflushed_writes >= self._max_unflushed_writes:
+                self.flush()
+            else:
+                self._schedule_flush()
+
+    def flush(self):
+        with self._lock:
+            self._cancel_flush_timer()
+            if not self.is_dirty:
+                return
+
+            self._write_file(self._data)
+            self._unflushed_writes = 0
+
+    def close(self):
+        self.flush()
+
+    def _schedule_flush(self):
+        if self._flush_interval_seconds is None or self._flush_timer:
+            return
+
+        self._flush_timer = threading.Timer(
+            self._flush_interval_seconds, self._flush_on_timer
+        )
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _flush_on_timer(self):
+        with self._lock:
+            self._flush_timer = None
+            if not self.is_in_batch:
+                self.flush()
+
+    def _cancel_flush_timer(self):
+        if self._flush_timer:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+    def _get_file_signature(self) -> Optional[_FileSignature]:
+        try:
+            file_stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return file_stat.st_mtime_ns, file_stat.st_size
+
+    def _read_file(self) -> Optional[_Tables]:
+        self._file_signature = self._get_file_signature()
+        if not self._file_signature or not self._file_signature[1]:
+            # An empty database, which TinyDB initialises itself
+            return None
+
+        with open(self.path, "rb") as db_file:
+            return _loads(db_file.read())
+
+    def _write_file(self, data: _Tables):
+        if self._is_loaded and self._get_file_signature() != self._file_signature:
+            raise DatabaseModifiedError(
+                "{} was modified by another process, "
+                "restart cerebrate to load the changes".format(self.path)
+            )
+
+        directory, file_name = os.path.split(os.path.abspath(self.path))
+        temp_fd, temp_path = tempfile.mkstemp(
+            dir=directory, prefix=file_name + ".", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(temp_fd, "wb") as temp_file:
+                temp_file.write(_dumps(data))
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            # mkstemp creates files only the owner can read
+            if os.path.exists(self.path):
+                os.chmod(temp_path, stat.S_IMODE(os.stat(self.path).st_mode))
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self._file_signature = self._get_file_signature()
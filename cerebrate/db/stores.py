@@ -0,0 +1,22 @@
+from typing import Union
+
+from .migration import migrate_to_sqlite, should_migrate_to_sqlite
+from .replay_store import ReplayStore
+from .sqlite_replay_store import SqliteReplayStore
+
+TINYDB_ENGINE = "tinydb"
+SQLITE_ENGINE = "sqlite"
+
+AnyReplayStore = Union[ReplayStore, SqliteReplayStore]
+
+
+def create_replay_store(db_data_path: str, engine: str) -> AnyReplayStore:
+    if engine == SQLITE_ENGINE:
+        if should_migrate_to_sqlite(db_data_path):
+            migrate_to_sqlite(db_data_path)
+        return SqliteReplayStore(db_data_path)
+
+    if engine == TINYDB_ENGINE:
+        return ReplayStore(db_data_path)
+
+    raise ValueError("unknown replay store engine: " + engine)
@@ -0,0 +1,137 @@
+import json
+import os
+from collections import Counter
+from typing import Dict, Final, Iterable, List, Optional, Set, Tuple
+
+
+class TagIndex:
+    # The index is saved along with a signature of the database file it was built
+    # from, so a database that was modified without updating the index (e.g. after
+    # a crash) is detected as stale and the index is rebuilt.
+
+    _VERSION: Final = 1
+
+    def __init__(self):
+        self._replay_tags: Final[Dict[str, Set[str]]] = {}
+        self._tag_replays: Final[Dict[str, Set[str]]] = {}
+
+    def __contains__(self, replay_hash: str) -> bool:
+        return replay_hash in self._replay_tags
+
+    def __len__(self) -> int:
+        return len(self._replay_tags)
+
+    def load(self, index_path: str, source_signature: Optional[List[int]]) -> bool:
+        if not source_signature or not os.path.exists(index_path):
+            return False
+
+        try:
+            with open(index_path, "r") as index_file:
+                data = json.load(index_file)
+        except (OSError, ValueError):
+            return False
+
+        if (
+            not isinstance(data, dict)
+            or data.get("version") != TagIndex._VERSION
+            or data.get("source") != source_signature
+        ):
+            return False
+
+        self._clear()
+        for tag, replay_hashes in data.get("tags", {}).items():
+            self._tag_replays[tag] = set(replay_hashes)
+            for replay_hash in replay_hashes:
+                self._replay_tags.setdefault(replay_hash, set()).add(tag)
+
+        return True
+
+    def save(self, index_path: str, source_signature: Optional[List[int]]):
+        data = {
+            "version": TagIndex._VERSION,
+            "source": source_signature,
+            "tags": {
+                tag: sorted(replay_hashes)
+                for tag, replay_hashes in self._tag_replays.items()
+            },
+        }
+
+        temp_path = index_path + ".tmp"
+        with open(temp_path, "w") as index_file:
+            json.dump(data, index_file)
+        os.replace(temp_path, index_path)
+
+    def rebuild(self, replay_tags: Iterable[Tuple[str, Iterable[str]]]):
+        self._clear()
+        for replay_hash, tags in replay_tags:
+            self.set_tags(replay_hash, tags)
+
+    def set_tags(self, replay_hash: str, tags: Iterable[str]):
+        new_tags = set(tags)
+        old_tags = self._replay_tags.get(replay_hash, set())
+
+        for tag in old_tags - new_tags:
+            self._discard(tag, replay_hash)
+        for tag in new_tags - old_tags:
+            self._tag_replays.setdefault(tag, set()).add(replay_hash)
+
+        if new_tags:
+            self._replay_tags[replay_hash] = new_tags
+        else:
+            self._replay_tags.pop(replay_hash, None)
+
+    def remove(self, replay_hash: str):
+        for tag in self._replay_tags.pop(replay_hash, set()):
+            self._discard(tag, replay_hash)
+
+    def query(
+        self, include_tags: Iterable[str], exclude_tags: Iterable[str]
+    ) -> Set[str]:
+        """returns the hashes of tagged replays with all include_tags and no exclude_tags"""
+
+        include_tags_set = set(include_tags)
+        if include_tags_set:
+            # Intersect starting from the rarest tag to keep intermediate sets small
+            tag_replays = sorted(
+                (self._tag_replays.get(tag, set()) for tag in include_tags_set),
+                key=len,
+            )
+            result = set(tag_replays[0]).intersection(*tag_replays[1:])
+        else:
+            result = set(self._replay_tags)
+
+        for tag in set(exclude_tags):
+            result.difference_update(self._tag_replays.get(tag, set()))
+
+        return result
+
+    def count_tags(self, replay_hashes: Set[str]) -> Counter:
+        """returns the number of the given replays with each tag"""
+
+        if len(replay_hashes) == len(self._replay_tags) and all(
+            replay_hash in self._replay_tags for replay_hash in replay_hashes
+        ):
+            return Counter(
+                {
+                    tag: len(tag_replays)
+                    for tag, tag_replays in self._tag_replays.items()
+                }
+            )
+
+        tag_counts = Counter()
+        for replay_hash in replay_hashes:
+            tag_counts.update(self._replay_tags.get(replay_hash, ()))
+        return tag_counts
+
+    def _discard(self, tag: str, replay_hash: str):
+        tag_replays = self._tag_replays.get(tag)
+        if tag_replays is None:
+            return
+
+        tag_replays.discard(replay_hash)
+        if not tag_replays:
+            del self._tag_replays[tag]
+
+    def _clear(self):
+        self._replay_tags.clear()
+        self._tag_replays.clear()
@@ -0,0 +1,143 @@
+import bisect
+from typing import Dict, Final, Iterable, Iterator, List, Optional, Tuple
+
+
+class TimestampIndex:
+    # (timestamp, hash) pairs kept sorted, so date ranges are answered by bisecting
+    # and results come out already in timestamp order. Replays without a timestamp
+    # are kept apart and ordered before the rest, as the oldest.
+
+    def __init__(self):
+        self._entries: Final[List[Tuple[int, str]]] = []
+        self._untimed_hashes: Final[List[str]] = []
+        self._timestamps: Final[Dict[str, Optional[int]]] = {}
+
+    def __contains__(self, replay_hash: str) -> bool:
+        return replay_hash in self._timestamps
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    def rebuild(self, replay_timestamps: Iterable[Tuple[str, Optional[int]]]):
+        self._entries.clear()
+        self._untimed_hashes.clear()
+        self._timestamps.clear()
+
+        self._timestamps.update(replay_timestamps)
+        self._entries.extend(
+            sorted(
+                (timestamp, replay_hash)
+                for replay_hash, timestamp in self._timestamps.items()
+                if timestamp is not None
+            )
+        )
+        self._untimed_hashes.extend(
+            sorted(
+                replay_hash
+                for replay_hash, timestamp in self._timestamps.items()
+                if timestamp is None
+            )
+        )
+
+    def set_timestamp(self, replay_hash: str, timestamp: Optional[int]):
+        if replay_hash in self._timestamps:
+            if self._timestamps[replay_hash] == timestamp:
+                return
+            self.remove(replay_hash)
+
+        self._timestamps[replay_hash] = timestamp
+        if timestamp is None:
+            bisect.insort(self._untimed_hashes, replay_hash)
+        else:
+            bisect.insort(self._entries, (timestamp, replay_hash))
+
+    def remove(self, replay_hash: str):
+        if replay_hash not in self._timestamps:
+            return
+
+        timestamp = self._timestamps.pop(replay_hash)
+        if timestamp is None:
+            del self._untimed_hashes[
+                bisect.bisect_left(self._untimed_hashes, replay_hash)
+            ]
+        else:
+            del self._entries[
+                bisect.bisect_left(self._entries, (timestamp, replay_hash))
+            ]
+
+    def get_replay_hashes(
+        self,
+        start_timestamp: Optional[int] = None,
+        end_timestamp: Optional[int] = None,
+        newest_first: bool = True,
+    ) -> List[str]:
+        """returns replay hashes in timestamp order, within the range if both ends are given"""
+
+        return list(
+            self.iter_replay_hashes(start_timestamp, end_timestamp, newest_first)
+        )
+
+    def count_replay_hashes(
+        self, start_timestamp: Optional[int] = None, end_timestamp: Optional[int] = None
+    ) -> int:
+        if None in [start_timestamp, end_timestamp]:
+            return len(self._timestamps)
+
+        start, end = self._get_range(start_timestamp, end_timestamp)
+        return end - start
+
+    def sort_replay_hashes(
+        self,
+        replay_hashes: Iterable[str],
+        start_timestamp: Optional[int] = None,
+        end_timestamp: Optional[int] = None,
+        newest_first: bool = True,
+    ) -> List[str]:
+        """returns the given replay hashes in the same order as get_replay_hashes"""
+
+        is_ranged = None not in [start_timestamp, end_timestamp]
+        entries = []
+        for replay_hash in replay_hashes:
+            if replay_hash not in self._timestamps:
+                continue
+
+            timestamp = self._timestamps[replay_hash]
+            if timestamp is None:
+                if not is_ranged:
+                    entries.append((False, 0, replay_hash))
+            elif not is_ranged or start_timestamp <= timestamp <= end_timestamp:
+                entries.append((True, timestamp, replay_hash))
+
+        entries.sort(reverse=newest_first)
+        return [replay_hash for _, _, replay_hash in entries]
+
+    def iter_replay_hashes(
+        self,
+        start_timestamp: Optional[int] = None,
+        end_timestamp: Optional[int] = None,
+        newest_first: bool = True,
+    ) -> Iterator[str]:
+        """yields replay hashes lazily, in the same order as get_replay_hashes"""
+
+        if None in [start_timestamp, end_timestamp]:
+            start, end = 0, len(self._entries)
+            untimed_hashes = self._untimed_hashes
+        else:
+            start, end = self._get_range(start_timestamp, end_timestamp)
+            untimed_hashes = []
+
+        if newest_first:
+            for index in range(end - 1, start - 1, -1):
+                yield self._entries[index][1]
+            yield from reversed(untimed_hashes)
+        else:
+            yield from untimed_hashes
+            for index in range(start, end):
+                yield self._entries[index][1]
+
+    def _get_range(self, start_timestamp: int, end_timestamp: int) -> Tuple[int, int]:
+        start = bisect.bisect_left(self._entries, (start_timestamp,))
+        end = bisect.bisect_left(self._entries, (end_timestamp,), lo=start)
+        while end < len(self._entries) and self._entries[end][0] == end_timestamp:
+            end += 1
+        return start, end
@@ -1 +1,2 @@
+from .parallel_replay_processor import process_replays_in_parallel
 from .replayprocessor import ReplayProcessor
@@ -1 +1,3 @@
 from .replay_data_extractor import ReplayDataExtractor
+from .replay_summary import ParticipantSummary, ReplaySummary, TeamSummary, UnitSummary
+from .unit_table import UnitTable
@@ -1,12 +1,19 @@
-import math
-from typing import Final, Optional, Tuple
+from typing import Dict, Final, List, Optional, Tuple
 
-import sc2reader.objects
-import sc2reader.resources
-from sc2reader.data import Unit
+import sc2reader
 
 from cerebrate.core import Replay
 
+from .replay_summary import (
+    ParticipantSummary,
+    ReplaySummary,
+    TeamSummary,
+    UnitSummary,
+)
+from .unit_table import UnitTable
+
+_BASE_STRUCTURES: Final = ["Hatchery", "Nexus", "CommandCenter"]
+
 
 class ReplayDataExtractor:
     DEFAULT_FPS: Final = 16
@@ -14,94 +21,129 @@ class ReplayDataExtractor:
     EARLY_GAME_END: Final = 60 * 5 * DEFAULT_FPS
     LATE_GAME_START: Final = 60 * 12 * DEFAULT_FPS
 
-    _player_team: Optional[sc2reader.objects.Team]
-    _opponent_team: Optional[sc2reader.objects.Team]
-    _player: Optional[sc2reader.objects.Participant]
-    _opponent: Optional[sc2reader.objects.Participant]
-
-    def __init__(self, replay: Replay):
+    # sc2reader load levels: details and players, or everything including units
+    DETAILS_LOAD_LEVEL: Final = 2
+    UNITS_LOAD_LEVEL: Final = 4
+
+    _player_team: Optional[TeamSummary]
+    _opponent_team: Optional[TeamSummary]
+    _player: Optional[ParticipantSummary]
+    _opponent: Optional[ParticipantSummary]
+
+    def __init__(
+        self,
+        replay: Replay,
+        replay_summary: Optional[ReplaySummary] = None,
+        max_load_level: int = UNITS_LOAD_LEVEL,
+        load_units: bool = False,
+    ):
         self._player_team = None
         self._opponent_team = None
         self._player = None
         self._opponent = None
 
+        self._unit_tables: Final[Dict[ParticipantSummary, UnitTable]] = {}
+        self._main_base_locations: Final[
+            Dict[ParticipantSummary, Optional[Tuple[int, int]]]
+        ] = {}
+
         self.replay_info: Final[Replay] = replay
+        self.max_load_level: Final[int] = max_load_level
+
+        # Only the cheap details are loaded up front, units are loaded on first use,
+        # unless the caller knows they will be used and the replay is parsed once
+        self.is_replay_summary_modified = replay_summary is None
+        if replay_summary is None:
+            load_units = (
+                load_units and max_load_level >= ReplayDataExtractor.UNITS_LOAD_LEVEL
+            )
+            replay_summary = ReplaySummary.from_source(
+                self._load_source_replay(
+                    ReplayDataExtractor.UNITS_LOAD_LEVEL
+                    if load_units
+                    else ReplayDataExtractor.DETAILS_LOAD_LEVEL
+                ),
+                include_units=load_units,
+            )
+        self.replay_summary: Final[ReplaySummary] = replay_summary
+
+    def _load_source_replay(self, load_level: int):
         # noinspection PyUnresolvedReferences
-        self.source_replay_data: Final[
-            sc2reader.resources.Replay
-        ] = sc2reader.load_replay(replay.path, load_level=4)
-        pass
-
-    @staticmethod
-    def get_original_unit_name(unit: Optional[Unit]) -> Optional[str]:
-        if not unit.type_history:
-            return None
-        return next(iter(unit.type_history.values())).name
-
-    @staticmethod
-    def is_base_structure(unit: Unit) -> bool:
-        original_unit_name = ReplayDataExtractor.get_original_unit_name(unit)
-        return original_unit_name and original_unit_name in [
-            "Hatchery",
-            "Nexus",
-            "CommandCenter",
-        ]
+        return sc2reader.load_replay(self.replay_info.path, load_level=load_level)
+
+    def get_units(self, participant: ParticipantSummary) -> List[UnitSummary]:
+        if participant.units is None:
+            if self.max_load_level < ReplayDataExtractor.UNITS_LOAD_LEVEL:
+                raise RuntimeError(
+                    "unit data was accessed by a pipeline that doesn't load units"
+                )
+
+            self.replay_summary.set_units_from(
+                ReplaySummary.from_source(
+                    self._load_source_replay(ReplayDataExtractor.UNITS_LOAD_LEVEL),
+                    include_units=True,
+                )
+            )
+            self.is_replay_summary_modified = True
+
+        return participant.units
+
+    def get_unit_table(self, participant: ParticipantSummary) -> UnitTable:
+        unit_table = self._unit_tables.get(participant)
+        if unit_table is None:
+            unit_table = UnitTable(self.get_units(participant))
+            self._unit_tables[participant] = unit_table
+        return unit_table
 
-    @staticmethod
     def get_main_base_location(
-        participant: Optional[sc2reader.objects.Participant],
+        self,
+        participant: Optional[ParticipantSummary],
     ) -> Optional[Tuple[int, int]]:
         if not participant:
             return None
 
-        starting_units = [unit for unit in participant.units if unit.started_at <= 0]
-        if not starting_units:
-            return None
-
-        base_structures = [
-            unit
-            for unit in starting_units
-            if ReplayDataExtractor.is_base_structure(unit)
-        ]
-        if not base_structures or len(base_structures) != 1:
-            return None
-
-        main_base_structure = base_structures[0]
+        if participant not in self._main_base_locations:
+            base_structures = self.get_unit_table(participant).get_units(
+                _BASE_STRUCTURES, started_at_most=0
+            )
+            self._main_base_locations[participant] = (
+                base_structures[0].location if len(base_structures) == 1 else None
+            )
 
-        return main_base_structure.location
+        return self._main_base_locations[participant]
 
     @property
-    def player_team(self) -> Optional[sc2reader.objects.Team]:
+    def player_team(self) -> Optional[TeamSummary]:
         if self._player_team:
             return self._player_team
 
         if (
             self.replay_info.player_team is None
-            or not len(self.source_replay_data.teams) > self.replay_info.player_team
+            or not len(self.replay_summary.teams) > self.replay_info.player_team
         ):
             return None
 
-        self._player_team = self.source_replay_data.teams[self.replay_info.player_team]
+        self._player_team = self.replay_summary.teams[self.replay_info.player_team]
         return self._player_team
 
     @property
-    def opponent_team(self) -> Optional[sc2reader.objects.Team]:
+    def opponent_team(self) -> Optional[TeamSummary]:
         if self._opponent_team:
             return self._opponent_team
 
         if (
             self.replay_info.opponent_team is None
-            or not len(self.source_replay_data.teams) > self.replay_info.opponent_team
+            or not len(self.replay_summary.teams) > self.replay_info.opponent_team
         ):
             return None
 
-        self._opponent_team = self.source_replay_data.teams[
+        self._opponent_team = self.replay_summary.teams[
             self.replay_info.opponent_team
         ]
         return self._opponent_team
 
     @property
-    def player(self) -> Optional[sc2reader.objects.Participant]:
+    def player(self) -> Optional[ParticipantSummary]:
         if self._player:
             return self._player
 
@@ -112,7 +154,7 @@ class ReplayDataExtractor:
         return self._player
 
     @property
-    def opponent(self) -> Optional[sc2reader.objects.Participant]:
+    def opponent(self) -> Optional[ParticipantSummary]:
         if self._opponent:
             return self._opponent
 
@@ -122,44 +164,43 @@ class ReplayDataExtractor:
         self._opponent = self.opponent_team.players[0]
         return self._opponent
 
-    # noinspection PyUnresolvedReferences
-    def is_proxy(self, unit: Optional[Unit]) -> bool:
-        if not self.player or not self.opponent:
-            return False
-
-        if not unit or not unit.is_building or not unit.location:
-            return False
-
-        def is_proxy_inner(
-            unit_location: Tuple[int, int],
-            main_base_location: Tuple[int, int],
-            enemy_base_location: Tuple[int, int],
-        ) -> bool:
-            """returns True if unit is located more than 40% of the distance towards the enemy base"""
+    def get_proxy_flags(
+        self,
+        participant: Optional[ParticipantSummary],
+        units: List[UnitSummary],
+    ) -> List[bool]:
+        """returns for each unit whether it is a structure located more than 40% of the distance towards the enemy base"""
+
+        flags = [False] * len(units)
+        if not participant or not self.player or not self.opponent:
+            return flags
+
+        if participant == self.player:
+            enemy = self.opponent
+        elif participant == self.opponent:
+            enemy = self.player
+        else:
+            return flags
 
-            dist_from_main_base = math.sqrt(
-                math.pow(main_base_location[0] - unit_location[0], 2)
-                + math.pow(main_base_location[1] - unit_location[1], 2)
-            )
-            dist_from_enemy_base = math.sqrt(
-                math.pow(enemy_base_location[0] - unit_location[0], 2)
-                + math.pow(enemy_base_location[1] - unit_location[1], 2)
-            )
-            return dist_from_main_base > 0.4 * (
-                dist_from_main_base + dist_from_enemy_base
-            )
+        main_base_location = self.get_main_base_location(participant)
+        enemy_base_location = self.get_main_base_location(enemy)
+        if not main_base_location or not enemy_base_location:
+            return flags
 
-        if unit.owner == self.player:
-            return is_proxy_inner(
-                unit.location,
-                ReplayDataExtractor.get_main_base_location(self.player),
-                ReplayDataExtractor.get_main_base_location(self.opponent),
-            )
-        elif unit.owner == self.opponent:
-            return is_proxy_inner(
-                unit.location,
-                ReplayDataExtractor.get_main_base_location(self.opponent),
-                ReplayDataExtractor.get_main_base_location(self.player),
-            )
-        else:
-            return False
+        candidates = [
+            index
+            for index, unit in enumerate(units)
+            if unit.is_building and unit.location and unit.owner == participant
+        ]
+        xs = [units[index].location[0] for index in candidates]
+        ys = [units[index].location[1] for index in candidates]
+
+        main_x, main_y = main_base_location
+        enemy_x, enemy_y = enemy_base_location
+        # d_main > 0.4 * (d_main + d_enemy) <=> 9 * d_main^2 > 4 * d_enemy^2
+        for index, x, y in zip(candidates, xs, ys):
+            dist_sq_from_main_base = (main_x - x) ** 2 + (main_y - y) ** 2
+            dist_sq_from_enemy_base = (enemy_x - x) ** 2 + (enemy_y - y) ** 2
+            flags[index] = 9 * dist_sq_from_main_base > 4 * dist_sq_from_enemy_base
+
+        return flags
@@ -0,0 +1,240 @@
+from typing import Final, List, Optional, Tuple, Any
+
+import sc2reader.objects
+import sc2reader.resources
+from sc2reader.data import Unit
+
+
+def get_original_unit_name(unit: Optional[Unit]) -> Optional[str]:
+    if not unit.type_history:
+        return None
+    return next(iter(unit.type_history.values())).name
+
+
+class UnitSummary:
+    name: Final[Optional[str]]
+    started_at: Final[int]
+    is_building: Final[bool]
+    is_army: Final[bool]
+    supply: Final[float]
+    location: Final[Optional[Tuple[int, int]]]
+    owner: Optional["ParticipantSummary"]
+
+    @staticmethod
+    def from_source(unit: Unit) -> "UnitSummary":
+        return UnitSummary(
+            name=get_original_unit_name(unit),
+            started_at=unit.started_at,
+            is_building=unit.is_building,
+            is_army=unit.is_army,
+            supply=unit.supply,
+            location=tuple(unit.location) if unit.location else None,
+        )
+
+    @staticmethod
+    def from_list(data: List[Any]) -> "UnitSummary":
+        name, started_at, is_building, is_army, supply, location = data
+        return UnitSummary(
+            name=name,
+            started_at=started_at,
+            is_building=is_building,
+            is_army=is_army,
+            supply=supply,
+            location=tuple(location) if location else None,
+        )
+
+    def __init__(
+        self,
+        name: Optional[str],
+        started_at: int,
+        is_building: bool,
+        is_army: bool,
+        supply: float,
+        location: Optional[Tuple[int, int]],
+    ):
+        self.name = name
+        self.started_at = started_at
+        self.is_building = is_building
+        self.is_army = is_army
+        self.supply = supply
+        self.location = location
+        self.owner = None
+
+    def to_list(self) -> List[Any]:
+        return [
+            self.name,
+            self.started_at,
+            self.is_building,
+            self.is_army,
+            self.supply,
+            list(self.location) if self.location else None,
+        ]
+
+
+class ParticipantSummary:
+    name: Final[str]
+    toon_handle: Final[str]
+    play_race: Final[Optional[str]]
+    pick_race: Final[Optional[str]]
+    result: Final[Optional[str]]
+    is_human: Final[bool]
+    # None when the replay was only loaded up to its details
+    units: Optional[List[UnitSummary]]
+
+    @staticmethod
+    def from_source(
+        participant: sc2reader.objects.Participant, include_units: bool
+    ) -> "ParticipantSummary":
+        return ParticipantSummary(
+            name=participant.name,
+            toon_handle=participant.toon_handle,
+            play_race=participant.play_race,
+            pick_race=participant.pick_race,
+            result=participant.result,
+            is_human=participant.is_human,
+            # Generators only look at army units and structures
+            units=(
+                [
+                    UnitSummary.from_source(unit)
+                    for unit in participant.units
+                    if unit.is_army or unit.is_building
+                ]
+                if include_units
+                else None
+            ),
+        )
+
+    @staticmethod
+    def from_dict(data: dict) -> "ParticipantSummary":
+        return ParticipantSummary(
+            name=data["name"],
+            toon_handle=data["toon_handle"],
+            play_race=data["play_race"],
+            pick_race=data["pick_race"],
+            result=data["result"],
+            is_human=data["is_human"],
+            units=(
+                [UnitSummary.from_list(unit) for unit in data["units"]]
+                if data["units"] is not None
+                else None
+            ),
+        )
+
+    def __init__(
+        self,
+        name: str,
+        toon_handle: str,
+        play_race: Optional[str],
+        pick_race: Optional[str],
+        result: Optional[str],
+        is_human: bool,
+        units: Optional[List[UnitSummary]],
+    ):
+        self.name = name
+        self.toon_handle = toon_handle
+        self.play_race = play_race
+        self.pick_race = pick_race
+        self.result = result
+        self.is_human = is_human
+        self.units = None
+        if units is not None:
+            self.set_units(units)
+
+    def set_units(self, units: List[UnitSummary]):
+        for unit in units:
+            unit.owner = self
+        self.units = units
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "toon_handle": self.toon_handle,
+            "play_race": self.play_race,
+            "pick_race": self.pick_race,
+            "result": self.result,
+            "is_human": self.is_human,
+            "units": (
+                [unit.to_list() for unit in self.units]
+                if self.units is not None
+                else None
+            ),
+        }
+
+
+class TeamSummary:
+    players: Final[List[ParticipantSummary]]
+
+    def __init__(self, players: List[ParticipantSummary]):
+        self.players = players
+
+
+class ReplaySummary:
+    # Bump whenever the summarised data changes, to invalidate cached summaries
+    VERSION: Final = 1
+
+    unix_timestamp: Final[Optional[int]]
+    game_type: Final[str]
+    map_name: Final[str]
+    teams: Final[List[TeamSummary]]
+
+    @staticmethod
+    def from_source(
+        source_replay: sc2reader.resources.Replay, include_units: bool
+    ) -> "ReplaySummary":
+        return ReplaySummary(
+            unix_timestamp=source_replay.unix_timestamp,
+            game_type=source_replay.game_type,
+            map_name=source_replay.map_name,
+            teams=[
+                TeamSummary(
+                    [
+                        ParticipantSummary.from_source(participant, include_units)
+                        for participant in team.players
+                    ]
+                )
+                for team in source_replay.teams
+            ],
+        )
+
+    @staticmethod
+    def from_dict(data: Optional[dict]) -> Optional["ReplaySummary"]:
+        if not data or data.get("version") != ReplaySummary.VERSION:
+            return None
+
+        return ReplaySummary(
+            unix_timestamp=data["unix_timestamp"],
+            game_type=data["game_type"],
+            map_name=data["map_name"],
+            teams=[
+                TeamSummary([ParticipantSummary.from_dict(player) for player in team])
+                for team in data["teams"]
+            ],
+        )
+
+    def __init__(
+        self,
+        unix_timestamp: Optional[int],
+        game_type: str,
+        map_name: str,
+        teams: List[TeamSummary],
+    ):
+        self.unix_timestamp = unix_timestamp
+        self.game_type = game_type
+        self.map_name = map_name
+        self.teams = teams
+
+    def set_units_from(self, other: "ReplaySummary"):
+        for team, other_team in zip(self.teams, other.teams):
+            for player, other_player in zip(team.players, other_team.players):
+                player.set_units(other_player.units or [])
+
+    def to_dict(self) -> dict:
+        return {
+            "version": ReplaySummary.VERSION,
+            "unix_timestamp": self.unix_timestamp,
+            "game_type": self.game_type,
+            "map_name": self.map_name,
+            "teams": [
+                [player.to_dict() for player in team.players] for team in self.teams
+            ],
+        }
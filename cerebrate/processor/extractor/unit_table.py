@@ -0,0 +1,62 @@
+import bisect
+import math
+from typing import Dict, Final, Iterable, List, Optional, Set, Tuple
+
+from .replay_summary import UnitSummary
+
+# (started_at, position in the participant's unit list, unit)
+_UnitEntry = Tuple[int, int, UnitSummary]
+
+
+def _take_started_at_most(
+    entries: List[_UnitEntry], started_at_most: Optional[int]
+) -> List[_UnitEntry]:
+    if started_at_most is None:
+        return entries
+    return entries[: bisect.bisect_right(entries, (started_at_most, math.inf))]
+
+
+class UnitTable:
+    # A participant's units, bucketed by original unit name and ordered by start
+    # time within each bucket, built in a single pass over the unit list.
+
+    army_unit_names: Final[Set[Optional[str]]]
+
+    def __init__(self, units: Iterable[UnitSummary]):
+        self._units_by_name: Final[Dict[Optional[str], List[_UnitEntry]]] = {}
+        self._army_units: Final[List[_UnitEntry]] = []
+        self.army_unit_names = set()
+
+        for position, unit in enumerate(units):
+            entry = (unit.started_at, position, unit)
+            self._units_by_name.setdefault(unit.name, []).append(entry)
+            if unit.is_army:
+                self._army_units.append(entry)
+                self.army_unit_names.add(unit.name)
+
+        for entries in self._units_by_name.values():
+            entries.sort(key=lambda entry: entry[:2])
+        self._army_units.sort(key=lambda entry: entry[:2])
+
+    def get_units(
+        self, unit_names: Iterable[str], started_at_most: Optional[int] = None
+    ) -> List[UnitSummary]:
+        """returns units with any of the given names, ordered by start time"""
+
+        entries = [
+            entry
+            for unit_name in set(unit_names)
+            for entry in _take_started_at_most(
+                self._units_by_name.get(unit_name, []), started_at_most
+            )
+        ]
+        entries.sort(key=lambda entry: entry[:2])
+        return [unit for _, _, unit in entries]
+
+    def get_army_units(
+        self, started_at_most: Optional[int] = None
+    ) -> List[UnitSummary]:
+        return [
+            unit
+            for _, _, unit in _take_started_at_most(self._army_units, started_at_most)
+        ]
@@ -16,7 +16,7 @@ class GameTypeTagGenerator(TagGenerator):
         self, replay: Replay, replay_data_extractor: ReplayDataExtractor
     ) -> List[str]:
 
-        game_type = replay_data_extractor.source_replay_data.game_type.lower()
+        game_type = replay_data_extractor.replay_summary.game_type.lower()
         if game_type in GAME_TYPES:
             return [Replay.create_game_tag(game_type)]
 
@@ -1,9 +1,7 @@
 from typing import List, Optional, Set, Callable
 
-import sc2reader.objects
-
 from cerebrate.core import Replay
-from cerebrate.processor.extractor import ReplayDataExtractor
+from cerebrate.processor.extractor import ParticipantSummary, ReplayDataExtractor
 from cerebrate.util import flatten
 from .tag_generator import TagGenerator
 
@@ -25,6 +23,8 @@ def _make_tag(tag_factory: Callable[[str], str], unit_name: str) -> str:
 
 
 class HighTechUnitTagGenerator(TagGenerator):
+    load_level = ReplayDataExtractor.UNITS_LOAD_LEVEL
+
     def tags_to_remove(self) -> List[str]:
         return flatten(
             [
@@ -40,20 +40,16 @@ class HighTechUnitTagGenerator(TagGenerator):
         self, replay: Replay, replay_data_extractor: ReplayDataExtractor
     ) -> List[str]:
         def get_unit_types(
-            participant: Optional[sc2reader.objects.Participant],
-        ) -> Set[str]:
-            if not participant or not participant.units:
+            participant: Optional[ParticipantSummary],
+        ) -> Set[Optional[str]]:
+            if not participant:
                 return set()
 
-            return set(
-                ReplayDataExtractor.get_original_unit_name(unit)
-                for unit in participant.units
-                if unit.is_army
-            )
+            return replay_data_extractor.get_unit_table(participant).army_unit_names
 
         def generate_tags_inner(
             tag_factory: Callable[[str], str],
-            participant: Optional[sc2reader.objects.Participant],
+            participant: Optional[ParticipantSummary],
         ) -> List[str]:
             unit_types = get_unit_types(participant)
             return [
@@ -16,7 +16,7 @@ class MapTagGenerator(TagGenerator):
     def generate_tags(
         self, replay: Replay, replay_data_extractor: ReplayDataExtractor
     ) -> List[str]:
-        map_name: str = replay_data_extractor.source_replay_data.map_name
+        map_name: str = replay_data_extractor.replay_summary.map_name
         map_name = map_name.lower()
         map_name = re.sub(r"[^\w\s]", "", map_name)
         map_name = re.sub(r"\s+", "_", map_name)
@@ -1,12 +1,7 @@
-from typing import List, Optional, Callable
-
-import sc2reader.data
-import sc2reader.objects
-
-from sc2reader.data import Unit
+from typing import List, Optional, Callable, Collection
 
 from cerebrate.core import Replay
-from cerebrate.processor.extractor import ReplayDataExtractor
+from cerebrate.processor.extractor import ParticipantSummary, ReplayDataExtractor
 from cerebrate.util import flatten
 from .tag_generator import TagGenerator
 
@@ -29,6 +24,8 @@ _MECH_UNITS = [
 
 
 class MechBioTagGenerator(TagGenerator):
+    load_level = ReplayDataExtractor.UNITS_LOAD_LEVEL
+
     def tags_to_remove(self) -> List[str]:
         return flatten(
             [
@@ -44,44 +41,38 @@ class MechBioTagGenerator(TagGenerator):
         self, replay: Replay, replay_data_extractor: ReplayDataExtractor
     ) -> List[str]:
         def get_army_supply(
-            participant: Optional[sc2reader.objects.Participant],
-            predicate: Callable[[Unit], bool] = None,
+            participant: Optional[ParticipantSummary],
+            unit_names: Optional[Collection[str]] = None,
         ) -> float:
-            def apply_predicate(unit: Unit) -> bool:
-                return True if predicate is None else predicate(unit)
-
             if not participant:
                 return 0
 
-            army_units = [
-                unit
-                for unit in participant.units
-                if unit.is_army
-                and apply_predicate(unit)
-                and unit.started_at < ReplayDataExtractor.LATE_GAME_START
-            ]
+            unit_table = replay_data_extractor.get_unit_table(participant)
+            # Start times are in whole frames
+            started_at_most = ReplayDataExtractor.LATE_GAME_START - 1
+            army_units = (
+                unit_table.get_army_units(started_at_most)
+                if unit_names is None
+                else [
+                    unit
+                    for unit in unit_table.get_units(unit_names, started_at_most)
+                    if unit.is_army
+                ]
+            )
             return sum(unit.supply for unit in army_units)
 
         def get_bio_supply(
-            participant: Optional[sc2reader.objects.Participant],
+            participant: Optional[ParticipantSummary],
         ) -> float:
-            return get_army_supply(
-                participant,
-                lambda unit: ReplayDataExtractor.get_original_unit_name(unit)
-                in _BIO_UNITS,
-            )
+            return get_army_supply(participant, _BIO_UNITS)
 
         def get_mech_supply(
-            participant: Optional[sc2reader.objects.Participant],
+            participant: Optional[ParticipantSummary],
         ) -> float:
-            return get_army_supply(
-                participant,
-                lambda unit: ReplayDataExtractor.get_original_unit_name(unit)
-                in _MECH_UNITS,
-            )
+            return get_army_supply(participant, _MECH_UNITS)
 
         def generate_tags_inner(
-            participant: Optional[sc2reader.objects.Participant],
+            participant: Optional[ParticipantSummary],
             tag_factory: Callable[[str], str],
         ) -> List[str]:
             bio_supply = get_bio_supply(participant)
@@ -1,10 +1,7 @@
 from typing import List, Optional
 
-import sc2reader.data
-import sc2reader.objects
-
 from cerebrate.core import Replay
-from cerebrate.processor.extractor import ReplayDataExtractor
+from cerebrate.processor.extractor import ParticipantSummary, ReplayDataExtractor
 from cerebrate.util import flatten
 from .tag_generator import TagGenerator
 
@@ -16,6 +13,8 @@ _PROTOSS_TECH_STRUCTURES = {
 
 
 class ProtossTechTagGenerator(TagGenerator):
+    load_level = ReplayDataExtractor.UNITS_LOAD_LEVEL
+
     def tags_to_remove(self) -> List[str]:
         return flatten(
             [
@@ -34,27 +33,23 @@ class ProtossTechTagGenerator(TagGenerator):
         self, replay: Replay, replay_data_extractor: ReplayDataExtractor
     ) -> List[str]:
         def generate_tags_inner(
-            participant: Optional[sc2reader.objects.Participant],
+            participant: Optional[ParticipantSummary],
         ) -> List[str]:
-            if not participant or not participant.units:
+            if not participant:
                 return []
 
-            protoss_tech_structures = [
-                unit
-                for unit in participant.units
-                if unit.started_at <= ReplayDataExtractor.EARLY_GAME_END
-                and ReplayDataExtractor.get_original_unit_name(unit)
-                in _PROTOSS_TECH_STRUCTURES
-            ]
-            protoss_tech_structures.sort(key=lambda unit: unit.started_at)
+            # Already ordered by start time
+            protoss_tech_structures = replay_data_extractor.get_unit_table(
+                participant
+            ).get_units(
+                _PROTOSS_TECH_STRUCTURES,
+                started_at_most=ReplayDataExtractor.EARLY_GAME_END,
+            )
 
             if not protoss_tech_structures:
                 return []
 
-            tech_structure_name = ReplayDataExtractor.get_original_unit_name(
-                protoss_tech_structures[0]
-            )
-            tag_name = _PROTOSS_TECH_STRUCTURES[tech_structure_name]
+            tag_name = _PROTOSS_TECH_STRUCTURES[protoss_tech_structures[0].name]
             return [tag_name]
 
         return [
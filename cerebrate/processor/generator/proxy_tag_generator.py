@@ -1,10 +1,7 @@
 from typing import List, Optional, Callable
 
-import sc2reader.data
-import sc2reader.objects
-
 from cerebrate.core import Replay
-from cerebrate.processor.extractor import ReplayDataExtractor
+from cerebrate.processor.extractor import ParticipantSummary, ReplayDataExtractor
 from cerebrate.util import flatten
 from .tag_generator import TagGenerator
 
@@ -30,6 +27,8 @@ def _make_tag(tag_factory: Callable[[str], str], structure_name: str) -> str:
 
 
 class ProxyTagGenerator(TagGenerator):
+    load_level = ReplayDataExtractor.UNITS_LOAD_LEVEL
+
     def tags_to_remove(self) -> List[str]:
         tag_factories = [Replay.create_player_tag, Replay.create_opponent_tag]
         deprecated_tags = flatten(
@@ -55,19 +54,22 @@ class ProxyTagGenerator(TagGenerator):
         self, replay: Replay, replay_data_extractor: ReplayDataExtractor
     ) -> List[str]:
         def get_proxy_structures(
-            participant: Optional[sc2reader.objects.Participant],
+            participant: Optional[ParticipantSummary],
         ) -> List[str]:
             if not participant:
                 return []
 
+            structures = replay_data_extractor.get_unit_table(participant).get_units(
+                _PRODUCTION_STRUCTURES,
+                started_at_most=ReplayDataExtractor.EARLY_GAME_END,
+            )
             result = [
-                ReplayDataExtractor.get_original_unit_name(unit)
-                for unit in participant.units
-                if unit.started_at <= ReplayDataExtractor.EARLY_GAME_END
-                and unit.is_building
-                and ReplayDataExtractor.get_original_unit_name(unit)
-                in _PRODUCTION_STRUCTURES
-                and replay_data_extractor.is_proxy(unit)
+                structure.name
+                for structure, is_proxy in zip(
+                    structures,
+                    replay_data_extractor.get_proxy_flags(participant, structures),
+                )
+                if is_proxy
             ]
             result.sort(
                 key=lambda structure: list(_PRODUCTION_STRUCTURES.keys()).index(
@@ -1,11 +1,16 @@
 import abc
-from typing import List
+from typing import ClassVar, List
 
 from cerebrate.core import Replay
 from cerebrate.processor.extractor.replay_data_extractor import ReplayDataExtractor
 
 
 class TagGenerator(metaclass=abc.ABCMeta):
+    # Bump whenever the tags generated for a replay may change
+    version: ClassVar[int] = 1
+    # The sc2reader load level of the data the generator reads
+    load_level: ClassVar[int] = ReplayDataExtractor.DETAILS_LOAD_LEVEL
+
     @abc.abstractmethod
     def tags_to_remove(self) -> List[str]:
         return []
@@ -0,0 +1,109 @@
+import concurrent.futures
+import os
+from typing import Callable, Final, Iterable, Iterator, List, Optional, Tuple, Dict
+
+from cerebrate.core import Replay
+from cerebrate.core.replay import Team
+from cerebrate.db import ReplayStoreSnapshot
+
+from .replayprocessor import ReplayProcessor
+
+# (tags, teams, timestamp, player_team, opponent_team, pipeline_version)
+_ProcessedReplayInfo = Tuple[
+    List[str],
+    List[Tuple[str, str]],
+    Optional[int],
+    Optional[int],
+    Optional[int],
+    Optional[str],
+]
+
+_MAX_PENDING_REPLAYS_PER_WORKER: Final = 4
+
+_worker_replay_processor: Optional[ReplayProcessor] = None
+
+
+def _init_worker(replay_store_snapshot: ReplayStoreSnapshot):
+    global _worker_replay_processor
+    # noinspection PyTypeChecker
+    _worker_replay_processor = ReplayProcessor(replay_store_snapshot, cache_size=0)
+
+
+def _process_replay_in_worker(replay: Replay) -> _ProcessedReplayInfo:
+    replay = _worker_replay_processor.process_replay(replay)
+    return (
+        replay.tags.to_list(),
+        [(team.team_id, team.name) for team in replay.teams],
+        replay.timestamp,
+        replay.player_team,
+        replay.opponent_team,
+        replay.pipeline_version,
+    )
+
+
+def _apply_processed_replay_info(
+    replay: Replay, processed_replay_info: _ProcessedReplayInfo
+) -> Replay:
+    (
+        tags,
+        teams,
+        timestamp,
+        player_team,
+        opponent_team,
+        pipeline_version,
+    ) = processed_replay_info
+    replay.set_tags(tags)
+    replay.teams.clear()
+    replay.teams.extend(Team(team_id, name) for team_id, name in teams)
+    replay.timestamp = timestamp
+    replay.player_team = player_team
+    replay.opponent_team = opponent_team
+    replay.pipeline_version = pipeline_version
+    return replay
+
+
+def process_replays_in_parallel(
+    replays: Iterable[Replay],
+    replay_store_snapshot: ReplayStoreSnapshot,
+    workers: Optional[int] = None,
+    on_error: Optional[Callable[[Replay, Exception], None]] = None,
+) -> Iterator[Replay]:
+    """processes replays in worker processes, yielding them in order of completion"""
+
+    if not workers:
+        workers = os.cpu_count() or 1
+
+    # Bound the number of submitted replays so large archives aren't queued at once
+    max_pending = workers * _MAX_PENDING_REPLAYS_PER_WORKER
+    pending: Dict[concurrent.futures.Future, Replay] = {}
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(replay_store_snapshot,),
+    ) as executor:
+
+        def wait_for_completed() -> Iterator[Replay]:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                replay = pending.pop(future)
+                try:
+                    processed_replay_info = future.result()
+                except Exception as error:
+                    # Failed replays are skipped when the caller handles errors
+                    if on_error is None:
+                        raise
+                    on_error(replay, error)
+                    continue
+
+                yield _apply_processed_replay_info(replay, processed_replay_info)
+
+        for replay in replays:
+            pending[executor.submit(_process_replay_in_worker, replay)] = replay
+            if len(pending) >= max_pending:
+                yield from wait_for_completed()
+
+        while pending:
+            yield from wait_for_completed()
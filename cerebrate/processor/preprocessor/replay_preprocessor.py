@@ -1,10 +1,16 @@
 import abc
+from typing import ClassVar
 
 from cerebrate.core import Replay
 from cerebrate.processor.extractor import ReplayDataExtractor
 
 
 class ReplayPreprocessor(metaclass=abc.ABCMeta):
+    # Bump whenever the preprocessed replay info may change
+    version: ClassVar[int] = 1
+    # The sc2reader load level of the data the preprocessor reads
+    load_level: ClassVar[int] = ReplayDataExtractor.DETAILS_LOAD_LEVEL
+
     @abc.abstractmethod
     def preprocess_replay(
         self, replay: Replay, replay_data_extractor: ReplayDataExtractor
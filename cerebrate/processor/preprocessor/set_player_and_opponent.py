@@ -25,7 +25,7 @@ class SetPlayerAndOpponent(ReplayPreprocessor):
         potential_player_teams = [
             index
             for index, team in enumerate(replay.teams)
-            if team.team_id in self.replay_store.get_replay_player_team_ids()
+            if self.replay_store.is_known_player_team_id(team.team_id)
         ]
         if len(potential_player_teams) != 1:
             return replay
@@ -11,5 +11,5 @@ class SetReplayTimestamp(ReplayPreprocessor):
     def preprocess_replay(
         self, replay: Replay, replay_data_extractor: ReplayDataExtractor
     ) -> Replay:
-        replay.timestamp = replay_data_extractor.source_replay_data.unix_timestamp
+        replay.timestamp = replay_data_extractor.replay_summary.unix_timestamp
         return replay
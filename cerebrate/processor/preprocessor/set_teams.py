@@ -13,7 +13,7 @@ class SetTeams(ReplayPreprocessor):
         self, replay: Replay, replay_data_extractor: ReplayDataExtractor
     ) -> Replay:
         replay.teams.clear()
-        for team in replay_data_extractor.source_replay_data.teams:
+        for team in replay_data_extractor.replay_summary.teams:
             team_id = ";".join(player.toon_handle for player in team.players)
             team_name = " ".join(player.name for player in team.players)
             replay.teams.append(Team(team_id=team_id, name=team_name))
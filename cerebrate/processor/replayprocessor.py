@@ -1,41 +1,179 @@
-from typing import Final
-
-import sc2reader
-import sc2reader.resources
+import hashlib
+from typing import (
+    Callable,
+    Final,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from cerebrate.core import Replay
 from cerebrate.db import ReplayStore
 
-from .extractor import ReplayDataExtractor
-from .generator import create_tag_generators
-from .preprocessor import create_preprocessors
-from ..util import flatten
+from .extractor import ReplayDataExtractor, ReplaySummary
+from .generator import TagGenerator, create_tag_generators
+from .preprocessor import ReplayPreprocessor, create_preprocessors
+from ..util import LruCache, flatten
+
+# (pipeline version, replay hash, player team, opponent team)
+_GeneratedTagsKey = Tuple[str, str, Optional[int], Optional[int]]
+
+
+def _calculate_pipeline_version(
+    pipeline: Iterable[Union[ReplayPreprocessor, TagGenerator]],
+) -> str:
+    hash_calculator = hashlib.sha256()
+    for step in pipeline:
+        hash_calculator.update(f"{type(step).__name__}:{step.version};".encode())
+    return hash_calculator.hexdigest()[:16]
+
+
+class _CompiledPipeline:
+    # Pipeline steps are stateless, so they are created once and shared by every
+    # replay the processor handles.
+
+    def __init__(
+        self,
+        preprocessors: List[ReplayPreprocessor],
+        tag_generators: List[TagGenerator],
+    ):
+        steps = preprocessors + tag_generators
+
+        self.version: Final[str] = _calculate_pipeline_version(steps)
+        # Replays are only parsed deeply enough for the most demanding step
+        self.load_level: Final[int] = max(step.load_level for step in steps)
+        self.preprocess_steps: Final[
+            Tuple[Callable[[Replay, ReplayDataExtractor], Replay], ...]
+        ] = tuple(preprocessor.preprocess_replay for preprocessor in preprocessors)
+        self.generate_steps: Final[
+            Tuple[Callable[[Replay, ReplayDataExtractor], List[str]], ...]
+        ] = tuple(tag_generator.generate_tags for tag_generator in tag_generators)
+        self.tags_to_remove: Final[FrozenSet[str]] = frozenset(
+            flatten(tag_generator.tags_to_remove() for tag_generator in tag_generators)
+        )
 
 
 class ReplayProcessor:
-    def __init__(self, replay_store: ReplayStore):
+    # Parsed replay summaries, and the tags generated for each player and opponent
+    # assignment of a replay, are kept in LRU caches so that reading the same
+    # replay again doesn't reparse it or rerun the tag generators.
+
+    DEFAULT_CACHE_SIZE: Final = 128
+
+    def __init__(
+        self,
+        replay_store: ReplayStore,
+        tag_generator_factory: Callable[[], List[TagGenerator]] = create_tag_generators,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+    ):
         self._replay_store: Final[ReplayStore] = replay_store
+        self._pipeline: Final[_CompiledPipeline] = _CompiledPipeline(
+            create_preprocessors(replay_store), tag_generator_factory()
+        )
+        self.pipeline_version: Final[str] = self._pipeline.version
 
-    def process_replay(self, replay: Replay) -> Replay:
-        replay_data_extractor = ReplayDataExtractor(replay)
+        self._replay_summary_cache: Final[LruCache[ReplaySummary]] = LruCache(
+            cache_size
+        )
+        self._generated_tags_cache: Final[LruCache[Tuple[str, ...]]] = LruCache(
+            cache_size
+        )
 
-        for preprocessor in create_preprocessors(self._replay_store):
-            replay = preprocessor.preprocess_replay(replay, replay_data_extractor)
+    def process_replay(self, replay: Replay) -> Replay:
+        return self._process_replay(replay, use_cache=True)
 
-        tag_generators = create_tag_generators()
-        for tag in flatten(
-            tag_generator.tags_to_remove() for tag_generator in tag_generators
-        ):
-            replay.remove_tag(tag)
+    def _process_replay(self, replay: Replay, use_cache: bool) -> Replay:
+        pipeline = self._pipeline
 
-        new_tags = (
-            flatten(
-                tag_generator.generate_tags(replay, replay_data_extractor)
-                for tag_generator in tag_generators
+        replay_summary = (
+            self._replay_summary_cache.get(replay.replay_hash) if use_cache else None
+        )
+        if replay_summary is None:
+            replay_summary = ReplaySummary.from_dict(
+                self._replay_store.load_replay_summary(replay.replay_hash)
             )
-            + replay.tags
+        replay_data_extractor = ReplayDataExtractor(
+            replay,
+            replay_summary,
+            max_load_level=pipeline.load_level,
+            load_units=replay_summary is None and self._will_use_units(replay),
         )
 
-        replay.set_tags(new_tags)
+        for preprocess in pipeline.preprocess_steps:
+            replay = preprocess(replay, replay_data_extractor)
+
+        replay.set_tags(
+            tag for tag in replay.tags if tag not in pipeline.tags_to_remove
+        )
+
+        # Generated tags only depend on the replay data and on who the player and
+        # opponent are
+        generated_tags_key: _GeneratedTagsKey = (
+            pipeline.version,
+            replay.replay_hash,
+            replay.player_team,
+            replay.opponent_team,
+        )
+        generated_tags = (
+            self._generated_tags_cache.get(generated_tags_key) if use_cache else None
+        )
+        if generated_tags is None:
+            generated_tags = tuple(
+                flatten(
+                    generate_tags(replay, replay_data_extractor)
+                    for generate_tags in pipeline.generate_steps
+                )
+            )
+
+        replay.set_tags(list(generated_tags) + replay.tags.to_list())
+        replay.pipeline_version = pipeline.version
+
+        if replay_data_extractor.is_replay_summary_modified:
+            self._replay_store.save_replay_summary(
+                replay.replay_hash, replay_data_extractor.replay_summary.to_dict()
+            )
+
+        if use_cache:
+            self._replay_summary_cache.put(
+                replay.replay_hash, replay_data_extractor.replay_summary
+            )
+            self._generated_tags_cache.put(generated_tags_key, generated_tags)
 
         return replay
+
+    def _will_use_units(self, replay: Replay) -> bool:
+        # Unit tags are only generated for a player and opponent, so units are
+        # needed if they are assigned or will be by SetPlayerAndOpponent
+        if replay.player_team is not None or replay.opponent_team is not None:
+            return True
+        if not replay.teams:
+            # Not processed yet, so any known player team might be in it
+            return bool(self._replay_store.get_replay_player_team_ids())
+        return any(
+            self._replay_store.is_known_player_team_id(team.team_id)
+            for team in replay.teams
+        )
+
+    def process_many(
+        self,
+        replays: Iterable[Replay],
+        on_error: Optional[Callable[[Replay, Exception], None]] = None,
+    ) -> Iterator[Replay]:
+        """processes replays lazily and in order, skipping failures if on_error is given"""
+
+        # Each replay is only processed once, so caching would only evict the
+        # replays that are being read
+        for replay in replays:
+            try:
+                processed_replay = self._process_replay(replay, use_cache=False)
+            except Exception as error:
+                if on_error is None:
+                    raise
+                on_error(replay, error)
+                continue
+
+            yield processed_replay
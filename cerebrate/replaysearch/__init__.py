@@ -1 +1,2 @@
 from .replay_searcher import ReplaySearcher
+from .replay_watcher import ReplayWatcher
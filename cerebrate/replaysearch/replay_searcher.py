@@ -6,27 +6,37 @@ from typing import Optional
 
 class ReplaySearcher:
     @staticmethod
-    def get_most_recently_played_replay_path() -> Optional[str]:
+    def get_default_accounts_path() -> Optional[str]:
         if sys.platform == "darwin":
-            accounts_dir = os.path.expanduser(
+            return os.path.expanduser(
                 "~/Library/Application Support/Blizzard/StarCraft II/Accounts"
             )
         elif sys.platform == "win32":
-            accounts_dir = os.path.expanduser("~/Documents/StarCraft II/Accounts")
+            return os.path.expanduser("~/Documents/StarCraft II/Accounts")
         else:
+            return None
+
+    @staticmethod
+    def get_replay_directory_pattern(accounts_path: str) -> str:
+        return os.path.join(accounts_path, "*", "*", "Replays", "Multiplayer")
+
+    @staticmethod
+    def get_most_recently_played_replay_path(
+        accounts_path: Optional[str] = None,
+    ) -> Optional[str]:
+        if not accounts_path:
+            accounts_path = ReplaySearcher.get_default_accounts_path()
+        if not accounts_path:
             raise RuntimeError("This platform is not supported for this operation.")
 
         replays = glob.glob(
-            accounts_dir + "/*/*/Replays/Multiplayer/*.SC2Replay", recursive=True
+            os.path.join(
+                ReplaySearcher.get_replay_directory_pattern(accounts_path),
+                "*.SC2Replay",
+            )
         )
 
         if not replays:
             return None
 
-        return next(
-            iter(
-                sorted(
-                    [replay for replay in replays], key=os.path.getmtime, reverse=True
-                )
-            )
-        )
+        return max(replays, key=os.path.getmtime)
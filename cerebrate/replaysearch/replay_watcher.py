@@ -0,0 +1,186 @@
+import glob
+import logging
+import os
+import threading
+from typing import Callable, Dict, Final, List, Optional, Set, Tuple
+
+from .replay_searcher import ReplaySearcher
+
+# (st_mtime_ns, st_size)
+_FileStat = Tuple[int, int]
+
+_logger: Final = logging.getLogger(__name__)
+
+
+class ReplayWatcher:
+    # Polls the replay directories of every account for new replays. Each
+    # directory's mtime is remembered so that only directories which changed, or
+    # which hold replays that are still being written, are listed again. A replay
+    # is reported once its mtime and size are unchanged between two polls.
+
+    _REPLAY_FILE_EXTENSION: Final = ".sc2replay"
+    _POLLS_PER_DIRECTORY_DISCOVERY: Final = 30
+
+    def __init__(
+        self,
+        accounts_path: str,
+        on_new_replay: Callable[[str], None],
+        poll_interval_seconds: float = 2.0,
+    ):
+        self.accounts_path: Final[str] = accounts_path
+        self._on_new_replay: Final[Callable[[str], None]] = on_new_replay
+        self._poll_interval_seconds: Final[float] = poll_interval_seconds
+
+        self._directory_mtimes: Final[Dict[str, int]] = {}
+        self._file_stats: Final[Dict[str, Dict[str, _FileStat]]] = {}
+        self._unsettled_file_paths: Final[Set[str]] = set()
+        self._poll_count = 0
+
+        self._lock: Final[threading.Lock] = threading.Lock()
+        self._most_recent: Optional[Tuple[int, str]] = None
+        self._stop_event: Final[threading.Event] = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.is_ready = False
+
+    @property
+    def most_recent_replay_path(self) -> Optional[str]:
+        with self._lock:
+            return self._most_recent[1] if self._most_recent else None
+
+    def start(self):
+        if self._thread:
+            return
+
+        self._thread = threading.Thread(
+            target=self._run, name="ReplayWatcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        # Replays that exist when the watcher starts are not reported as new
+        self._discover_directories(report_new=False)
+        self.is_ready = True
+
+        while not self._stop_event.wait(self._poll_interval_seconds):
+            try:
+                self.poll()
+            except Exception:
+                _logger.exception("failed to poll for new replays")
+
+    def poll(self):
+        self._poll_count += 1
+        if self._poll_count % ReplayWatcher._POLLS_PER_DIRECTORY_DISCOVERY == 0:
+            self._discover_directories(report_new=True)
+
+        for directory in list(self._directory_mtimes):
+            try:
+                directory_mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                self._forget_directory(directory)
+                continue
+
+            has_unsettled_files = any(
+                os.path.dirname(file_path) == directory
+                for file_path in self._unsettled_file_paths
+            )
+            if (
+                directory_mtime == self._directory_mtimes[directory]
+                and not has_unsettled_files
+            ):
+                continue
+
+            self._directory_mtimes[directory] = directory_mtime
+            self._report(self._scan_directory(directory, report_new=True))
+
+    def _discover_directories(self, report_new: bool):
+        for directory in glob.glob(
+            ReplaySearcher.get_replay_directory_pattern(self.accounts_path)
+        ):
+            if directory in self._directory_mtimes:
+                continue
+
+            try:
+                self._directory_mtimes[directory] = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            self._report(self._scan_directory(directory, report_new))
+
+    def _scan_directory(self, directory: str, report_new: bool) -> List[str]:
+        """returns the paths of new replays in directory that are fully written"""
+
+        previous_file_stats = self._file_stats.get(directory, {})
+        file_stats: Dict[str, _FileStat] = {}
+        settled_file_paths = []
+
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.name.lower().endswith(
+                        ReplayWatcher._REPLAY_FILE_EXTENSION
+                    ):
+                        continue
+
+                    stat = entry.stat()
+                    file_stat = (stat.st_mtime_ns, stat.st_size)
+                    file_stats[entry.name] = file_stat
+                    self._update_most_recent(file_stat[0], entry.path)
+
+                    if not report_new:
+                        continue
+
+                    if previous_file_stats.get(entry.name) != file_stat:
+                        self._unsettled_file_paths.add(entry.path)
+                    elif entry.path in self._unsettled_file_paths:
+                        self._unsettled_file_paths.discard(entry.path)
+                        settled_file_paths.append(entry.path)
+        except OSError:
+            return []
+
+        self._file_stats[directory] = file_stats
+        if previous_file_stats.keys() - file_stats.keys():
+            self._recalculate_most_recent()
+
+        return settled_file_paths
+
+    def _forget_directory(self, directory: str):
+        self._directory_mtimes.pop(directory, None)
+        self._file_stats.pop(directory, None)
+        self._unsettled_file_paths.difference_update(
+            [
+                file_path
+                for file_path in self._unsettled_file_paths
+                if os.path.dirname(file_path) == directory
+            ]
+        )
+        self._recalculate_most_recent()
+
+    def _update_most_recent(self, mtime: int, file_path: str):
+        with self._lock:
+            if not self._most_recent or self._most_recent < (mtime, file_path):
+                self._most_recent = (mtime, file_path)
+
+    def _recalculate_most_recent(self):
+        # Only needed when replays are deleted
+        most_recent = max(
+            (
+                (file_stat[0], os.path.join(directory, file_name))
+                for directory, file_stats in self._file_stats.items()
+                for file_name, file_stat in file_stats.items()
+            ),
+            default=None,
+        )
+        with self._lock:
+            self._most_recent = most_recent
+
+    def _report(self, replay_paths: List[str]):
+        for replay_path in replay_paths:
+            try:
+                self._on_new_replay(replay_path)
+            except Exception:
+                _logger.exception("failed to handle new replay %s", replay_path)
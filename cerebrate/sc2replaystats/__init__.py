@@ -0,0 +1,2 @@
+from .sc2replaystats_exporter import Sc2ReplayStatsExporter
+from .upload_cache import UploadCache
@@ -0,0 +1,174 @@
+import asyncio
+import concurrent.futures
+import json
+import time
+from typing import Any, Dict, Final, Iterable, List, Optional, Tuple
+
+import requests
+import requests.adapters
+
+from cerebrate.core import Replay
+
+from .upload_cache import UploadCache
+
+
+def _read_json_object(response: requests.Response) -> Optional[Dict[str, Any]]:
+    # Error pages from sc2replaystats or proxies in between aren't always JSON
+    try:
+        data = json.loads(response.text)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class Sc2ReplayStatsExporter:
+    # Replays are uploaded a bounded number at a time over a pooled keep-alive
+    # session. The blocking requests run on a thread pool so the event loop is
+    # never blocked. Each upload's status is then polled on its own exponential
+    # backoff schedule until sc2replaystats finishes processing it.
+
+    DEFAULT_BASE_URL: Final = "http://api.sc2replaystats.com"
+
+    def __init__(
+        self,
+        auth_key: str,
+        upload_cache: UploadCache,
+        base_url: str = DEFAULT_BASE_URL,
+        max_concurrent_uploads: int = 4,
+        initial_poll_interval_seconds: float = 1.0,
+        max_poll_interval_seconds: float = 30.0,
+        poll_timeout_seconds: float = 600.0,
+    ):
+        self._auth_key: Final[str] = auth_key
+        self._upload_cache: Final[UploadCache] = upload_cache
+        self._base_url: Final[str] = base_url.rstrip("/")
+        self._initial_poll_interval_seconds: Final[float] = (
+            initial_poll_interval_seconds
+        )
+        self._max_poll_interval_seconds: Final[float] = max_poll_interval_seconds
+        self._poll_timeout_seconds: Final[float] = poll_timeout_seconds
+
+        # Status polls share the pool with uploads, so it's sized to let polling
+        # continue while every upload slot is busy
+        max_connections = max_concurrent_uploads * 2
+        self._upload_semaphore: Final[asyncio.Semaphore] = asyncio.Semaphore(
+            max_concurrent_uploads
+        )
+        self._executor: Final[concurrent.futures.ThreadPoolExecutor] = (
+            concurrent.futures.ThreadPoolExecutor(max_workers=max_connections)
+        )
+
+        self._session: Final[requests.Session] = requests.Session()
+        self._session.headers["Authorization"] = auth_key
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=max_connections
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self._session.close()
+
+    async def export_replays(
+        self, replays: Iterable[Replay]
+    ) -> List[Tuple[Replay, str]]:
+        """returns (replay, sc2replaystats replay id) pairs for the replays which were exported"""
+
+        replays = list(replays)
+        try:
+            replay_ids = await asyncio.gather(
+                *(self._export_replay(replay) for replay in replays)
+            )
+        finally:
+            self._upload_cache.save()
+
+        return [
+            (replay, replay_id)
+            for replay, replay_id in zip(replays, replay_ids)
+            if replay_id
+        ]
+
+    async def _export_replay(self, replay: Replay) -> Optional[str]:
+        replay_id = self._upload_cache.get_replay_id(self._auth_key, replay.replay_hash)
+        if replay_id:
+            return replay_id
+
+        queue_id = self._upload_cache.get_queue_id(self._auth_key, replay.replay_hash)
+        if not queue_id:
+            async with self._upload_semaphore:
+                queue_id = await self._run_in_executor(self._upload_replay, replay)
+            if not queue_id:
+                return None
+            self._upload_cache.set_queue_id(
+                self._auth_key, replay.replay_hash, queue_id
+            )
+
+        replay_id = await self._poll_replay_id(queue_id)
+        if replay_id:
+            self._upload_cache.set_replay_id(
+                self._auth_key, replay.replay_hash, replay_id
+            )
+        elif replay_id is not None:
+            # The upload was rejected, so it's uploaded again on the next export
+            self._upload_cache.remove(self._auth_key, replay.replay_hash)
+        return replay_id
+
+    async def _poll_replay_id(self, queue_id: str) -> Optional[str]:
+        """returns the replay id, "" if the upload failed, or None on timeout"""
+
+        deadline = time.monotonic() + self._poll_timeout_seconds
+        poll_interval_seconds = self._initial_poll_interval_seconds
+        while time.monotonic() < deadline:
+            await asyncio.sleep(poll_interval_seconds)
+            replay_id = await self._run_in_executor(self._get_replay_id, queue_id)
+            if replay_id is not None:
+                return replay_id
+
+            poll_interval_seconds = min(
+                poll_interval_seconds * 2, self._max_poll_interval_seconds
+            )
+
+        return None
+
+    async def _run_in_executor(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, func, *args
+        )
+
+    def _upload_replay(self, replay: Replay) -> Optional[str]:
+        try:
+            with open(replay.path, "rb") as file:
+                response = self._session.post(
+                    self._base_url + "/replay",
+                    data={
+                        "upload_method": "ext",
+                    },
+                    files={"replay_file": file},
+                )
+        except (OSError, requests.RequestException):
+            return None
+
+        if response.status_code != 200:
+            return None
+
+        data = _read_json_object(response)
+        return data.get("replay_queue_id") if data else None
+
+    def _get_replay_id(self, queue_id: str) -> Optional[str]:
+        try:
+            response = self._session.get(
+                "{}/replay/status/{}".format(self._base_url, queue_id)
+            )
+        except requests.RequestException:
+            # Connection errors are transient, so the replay is polled again
+            return None
+
+        if response.status_code != 200:
+            # Don't bother waiting if we can't get an OK response
+            return ""
+
+        data = _read_json_object(response)
+        if data is None:
+            return ""
+        return data.get("replay_id")
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Final, Optional
+
+
+def _get_account_key(auth_key: str) -> str:
+    # Uploads are recorded per account without writing the auth key itself to disk
+    return hashlib.sha256(auth_key.encode()).hexdigest()[:16]
+
+
+class UploadCache:
+    # Remembers the upload queue id, and once processing finishes the replay id,
+    # of every replay uploaded to each sc2replaystats account, so a replay is
+    # never uploaded to an account twice.
+
+    _VERSION: Final = 2
+    _QUEUE_ID_KEY: Final = "queueId"
+    _REPLAY_ID_KEY: Final = "replayId"
+
+    def __init__(self, cache_path: str):
+        self.cache_path: Final[str] = cache_path
+        # account key -> replay hash -> upload
+        self._uploads: Final[Dict[str, Dict[str, Dict[str, str]]]] = {}
+        self._lock: Final[threading.Lock] = threading.Lock()
+        self._load()
+
+    def get_queue_id(self, auth_key: str, replay_hash: str) -> Optional[str]:
+        with self._lock:
+            return self._get_upload(auth_key, replay_hash).get(
+                UploadCache._QUEUE_ID_KEY
+            )
+
+    def get_replay_id(self, auth_key: str, replay_hash: str) -> Optional[str]:
+        with self._lock:
+            return self._get_upload(auth_key, replay_hash).get(
+                UploadCache._REPLAY_ID_KEY
+            )
+
+    def set_queue_id(self, auth_key: str, replay_hash: str, queue_id: str):
+        with self._lock:
+            self._uploads.setdefault(_get_account_key(auth_key), {})[replay_hash] = {
+                UploadCache._QUEUE_ID_KEY: queue_id
+            }
+
+    def set_replay_id(self, auth_key: str, replay_hash: str, replay_id: str):
+        with self._lock:
+            self._uploads.setdefault(_get_account_key(auth_key), {}).setdefault(
+                replay_hash, {}
+            )[UploadCache._REPLAY_ID_KEY] = replay_id
+
+    def remove(self, auth_key: str, replay_hash: str):
+        with self._lock:
+            self._uploads.get(_get_account_key(auth_key), {}).pop(replay_hash, None)
+
+    def save(self):
+        with self._lock:
+            data = {
+                "version": UploadCache._VERSION,
+                "uploads": {
+                    account_key: dict(uploads)
+                    for account_key, uploads in self._uploads.items()
+                },
+            }
+
+        temp_path = self.cache_path + ".tmp"
+        with open(temp_path, "w") as cache_file:
+            json.dump(data, cache_file)
+        os.replace(temp_path, self.cache_path)
+
+    def _get_upload(self, auth_key: str, replay_hash: str) -> Dict[str, str]:
+        return self._uploads.get(_get_account_key(auth_key), {}).get(replay_hash, {})
+
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return
+
+        try:
+            with open(self.cache_path, "r") as cache_file:
+                data = json.load(cache_file)
+        except (OSError, ValueError):
+            return
+
+        # Older caches don't record which account replays were uploaded to, so
+        # they are discarded
+        if isinstance(data, dict) and data.get("version") == UploadCache._VERSION:
+            self._uploads.update(data.get("uploads", {}))
@@ -6,6 +6,10 @@ from typing import Final, Optional, Any
 class CerebrateSettings:
     _SETTINGS_FILE_NAME: Final[str] = "settings.ini"
     _SCELIGHT_PATH_KEY: Final[str] = "scelight_path"
+    _REPLAY_STORE_ENGINE_KEY: Final[str] = "replay_store_engine"
+    _DEFAULT_REPLAY_STORE_ENGINE: Final[str] = "tinydb"
+    _ACCOUNTS_PATH_KEY: Final[str] = "accounts_path"
+    _SC2REPLAYSTATS_BASE_URL_KEY: Final[str] = "sc2replaystats_base_url"
 
     def __init__(self, settings_path: str):
         self.settings_file_path: Final[str] = os.path.join(
@@ -22,6 +26,33 @@ class CerebrateSettings:
     def scelight_path(self, value: Optional[str]):
         self._set_str(CerebrateSettings._SCELIGHT_PATH_KEY, value)
 
+    @property
+    def replay_store_engine(self) -> str:
+        return (
+            self._get_str(CerebrateSettings._REPLAY_STORE_ENGINE_KEY)
+            or CerebrateSettings._DEFAULT_REPLAY_STORE_ENGINE
+        )
+
+    @replay_store_engine.setter
+    def replay_store_engine(self, value: Optional[str]):
+        self._set_str(CerebrateSettings._REPLAY_STORE_ENGINE_KEY, value)
+
+    @property
+    def accounts_path(self) -> Optional[str]:
+        return self._get_str(CerebrateSettings._ACCOUNTS_PATH_KEY)
+
+    @accounts_path.setter
+    def accounts_path(self, value: Optional[str]):
+        self._set_str(CerebrateSettings._ACCOUNTS_PATH_KEY, value)
+
+    @property
+    def sc2replaystats_base_url(self) -> Optional[str]:
+        return self._get_str(CerebrateSettings._SC2REPLAYSTATS_BASE_URL_KEY)
+
+    @sc2replaystats_base_url.setter
+    def sc2replaystats_base_url(self, value: Optional[str]):
+        self._set_str(CerebrateSettings._SC2REPLAYSTATS_BASE_URL_KEY, value)
+
     def _get_str(self, option: str) -> Optional[str]:
         self._reload()
         return self.config.get(configparser.DEFAULTSECT, option, fallback=None)
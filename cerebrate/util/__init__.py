@@ -1,5 +1,7 @@
 from typing import Iterable
 
+from .lru_cache import LruCache
+
 
 def flatten(iterable_to_flatten: Iterable[Iterable]):
     return [item for sublist in iterable_to_flatten for item in sublist]
@@ -0,0 +1,42 @@
+import collections
+import threading
+from typing import Final, Generic, Hashable, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+class LruCache(Generic[V]):
+    # A thread-safe mapping holding at most max_size entries, evicting the least
+    # recently used entry first.
+
+    def __init__(self, max_size: int):
+        if max_size < 0:
+            raise ValueError("max_size must not be negative")
+
+        self.max_size: Final[int] = max_size
+        self._entries: Final[collections.OrderedDict] = collections.OrderedDict()
+        self._lock: Final[threading.Lock] = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: V):
+        if not self.max_size:
+            return
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()